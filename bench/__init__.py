@@ -0,0 +1,9 @@
+"""Воспроизводимые замеры производительности дашборда на синтетических данных.
+
+Запуск из корня репозитория:
+
+    python -m bench --sizes 10000 100000 --output bench_results.json
+
+Источники данных заменяются локальными заглушками (FTP-каталог и лист gspread),
+поэтому замеры не зависят от сети и учетных данных.
+"""
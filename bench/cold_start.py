@@ -0,0 +1,91 @@
+"""Проверка времени холодного старта dashboard.py.
+
+Импорт выполняется в чистом интерпретаторе (streamlit уже загружен, как в
+рабочем процессе Streamlit). Проверка завершается с кодом 1, если импорт
+дольше бюджета, если при импорте загружены тяжелые зависимости источников
+данных или если импорт создал файлы в рабочем каталоге.
+
+    python -m bench.cold_start --budget 0.5
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Модули, которые должны загружаться только при первом использовании
+LAZY_MODULES = ['gspread', 'google.oauth2', 'requests', 'openpyxl', 'plotly.express',
+                'data_loader', 'ftp_excel_reader', 'sheets_client', 'read_json']
+
+_PROBE = """
+import json, sys, time
+sys.path.insert(0, {root!r})
+import streamlit
+started = time.perf_counter()
+import dashboard
+elapsed = time.perf_counter() - started
+print(json.dumps({{'seconds': elapsed, 'loaded': [m for m in {lazy!r} if m in sys.modules]}}))
+"""
+
+
+def probe(workdir):
+    """Один холодный импорт; возвращает время, загруженные модули и профиль -X importtime"""
+    env = dict(os.environ, REFRESHER_MODE="external")
+    env.pop('LOG_DIR', None)
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", _PROBE.format(root=REPO_ROOT, lazy=LAZY_MODULES)],
+        cwd=workdir, env=env, capture_output=True, text=True, check=True,
+    )
+    result = json.loads(completed.stdout.strip().splitlines()[-1])
+    result['profile'] = [line for line in completed.stderr.splitlines() if line.startswith("import time:")]
+    return result
+
+
+def slowest_imports(profile, limit):
+    """Модули с наибольшим собственным временем импорта"""
+    rows = []
+    for line in profile[1:]:
+        parts = line.split('|')
+        try:
+            rows.append((int(parts[0].split(':')[1]), int(parts[1]), parts[2].rstrip()))
+        except (IndexError, ValueError):
+            continue
+    return sorted(rows, reverse=True)[:limit]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Бюджет времени холодного импорта dashboard.py")
+    parser.add_argument("--budget", type=float, default=float(os.getenv("COLD_START_BUDGET", "0.5")),
+                        help="допустимое время импорта dashboard.py в секундах")
+    parser.add_argument("--runs", type=int, default=3, help="число запусков (берется лучший)")
+    parser.add_argument("--top", type=int, default=10, help="сколько самых медленных модулей показать")
+    args = parser.parse_args(argv)
+
+    failures = []
+    with tempfile.TemporaryDirectory(prefix="km_cold_start_") as workdir:
+        results = [probe(workdir) for _ in range(args.runs)]
+        created = os.listdir(workdir)
+    best = min(results, key=lambda result: result['seconds'])
+
+    print(f"Импорт dashboard.py: {best['seconds']:.3f} с (бюджет {args.budget:g} с, лучший из {args.runs})")
+    print("Самые медленные модули (собственное время, мкс):")
+    for own, cumulative, name in slowest_imports(best['profile'], args.top):
+        print(f"  {own:>8} {cumulative:>9} {name}")
+
+    if best['seconds'] > args.budget:
+        failures.append(f"импорт дольше бюджета: {best['seconds']:.3f} с > {args.budget:g} с")
+    if best['loaded']:
+        failures.append(f"при импорте загружены модули: {', '.join(best['loaded'])}")
+    if created:
+        failures.append(f"импорт создал файлы в рабочем каталоге: {', '.join(created)}")
+
+    for failure in failures:
+        print(f"ОШИБКА: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,179 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+DEFAULT_SIZES = [10_000, 100_000]
+
+
+def _git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def timed(results, size, stage, func, rows=None):
+    """Выполняет этап, записывает время и возвращает результат"""
+    started = time.perf_counter()
+    value = func()
+    seconds = time.perf_counter() - started
+    if rows is None:
+        rows = len(value) if hasattr(value, '__len__') else None
+    results.append({'size': size, 'stage': stage, 'seconds': round(seconds, 6), 'rows': rows})
+    print(f"{size:>9} {stage:<28} {seconds:10.3f} с", flush=True)
+    return value
+
+
+def bench_size(size, workdir, days_back, results, memory):
+    """Замеры всех этапов для одного объема данных"""
+    # Модули проекта импортируются после настройки LOG_DIR в main()
+    import pandas as pd
+    from bench import synthetic
+    from bench.stand_ins import FakeWorksheet, local_ftp
+    from branch_normalizer import BranchNormalizer
+    from cache_manager import CacheManager
+    from date_parser import parse_dates
+    from dtype_schema import apply_schema, memory_report
+    from ftp_excel_reader import FTPExcelReader
+    from metrics import MetricsCube, compute_metrics, get_status_metrics
+    from scoring_store import ScoringStore
+    import dashboard
+
+    size_dir = os.path.join(workdir, str(size))
+    ftp_root = os.path.join(size_dir, 'ftp_root')
+    os.makedirs(ftp_root, exist_ok=True)
+
+    # Подготовка данных в замеры не входит
+    excel_path = os.path.join(ftp_root, 'bench_1c.xlsx')
+    if not os.path.exists(excel_path):
+        synthetic.write_excel(synthetic.excel_frame(size, days_back), excel_path)
+    worksheet = FakeWorksheet(synthetic.scoring_values(size, days_back))
+
+    # 1С: скачивание, потоковое чтение, даты, филиалы
+    os.environ['FTP_FILENAME'] = 'bench_1c.xlsx'
+    with local_ftp(ftp_root):
+        reader = FTPExcelReader(store_dir=os.path.join(size_dir, 'ftp_store'))
+        timed(results, size, 'fetch_1c', reader.download_excel, rows=size)
+        timed(results, size, 'fetch_1c_unchanged', reader.download_excel, rows=size)
+        local_path = os.path.join(reader.store_dir, 'bench_1c.xlsx')
+        raw = timed(results, size, 'read_excel_stream', lambda: reader._read_columns(local_path))
+        timed(results, size, 'date_parsing', lambda: parse_dates(raw['Дата'], source="1С"))
+        timed(results, size, 'branch_normalization', lambda: BranchNormalizer().normalize(raw['Филиал'], source="1С"))
+
+        reader = FTPExcelReader(store_dir=os.path.join(size_dir, 'ftp_store_full'))
+        excel_df = timed(results, size, 'read_excel_total', reader.read_excel)
+        timed(results, size, 'read_excel_cached', reader.read_excel)
+
+    # Скоринг: полная и инкрементальная синхронизация
+    store = ScoringStore(store_file=os.path.join(size_dir, 'scoring_rows.feather'))
+    scoring_df = timed(results, size, 'scoring_full_sync', lambda: store.sync(worksheet))
+    new_rows = synthetic.scoring_values(max(1, size // 100), days_back=1, seed=2)[1:]
+    worksheet.values.extend(new_rows)
+    scoring_df = timed(results, size, 'scoring_incremental_sync', lambda: store.sync(worksheet))
+
+    # Память до и после компактной схемы
+    plain_scoring = pd.DataFrame(worksheet.values[1:], columns=worksheet.values[0])
+    plain_scoring['Дата'] = parse_dates(plain_scoring['Дата'], source="скоринга")
+    plain_excel = raw.assign(Дата=excel_df['Дата'].to_numpy())
+    for frame_name, plain in (('scoring', plain_scoring), ('1c', plain_excel)):
+        compact = timed(results, size, f'apply_schema_{frame_name}', lambda: apply_schema(plain))
+        report = memory_report(plain, compact)
+        memory.append({'size': size, 'frame': frame_name, 'columns': report.reset_index(names='column').to_dict('records')})
+        print(report.to_string(), flush=True)
+
+    # Кэш 1С
+    cache_manager = CacheManager(cache_file=os.path.join(size_dir, 'yesterday_data.feather'),
+                                 legacy_file=os.path.join(size_dir, 'yesterday_data.json'))
+    timed(results, size, 'cache_save', lambda: cache_manager.save_data(excel_df), rows=len(excel_df))
+    timed(results, size, 'cache_load', cache_manager.get_yesterday_data)
+
+    # Метрики и графики
+    start = (datetime.now() - timedelta(days=30)).date()
+    timed(results, size, 'metrics_compute_rows', lambda: compute_metrics(scoring_df, 'Филиал'), rows=len(scoring_df))
+    timed(results, size, 'status_metrics_rows', lambda: get_status_metrics(scoring_df), rows=len(scoring_df))
+    cube = MetricsCube()
+    timed(results, size, 'cube_build', lambda: cube.refresh(scoring_df), rows=len(scoring_df))
+    timed(results, size, 'cube_panels', lambda: (
+        cube.totals(start), cube.metrics('Филиал', start), cube.crosstab('Филиал', start), cube.daily(start)
+    ), rows=len(cube.counts))
+
+    status_counts = cube.status_counts(start)
+    crosstab = cube.crosstab('Филиал', start)
+    daily_status = cube.daily(start)
+    figures = timed(results, size, 'chart_build', lambda: [
+        dashboard.create_status_pie_chart(status_counts),
+        dashboard.create_bar_chart(crosstab, "Статусы по филиалам"),
+        dashboard.create_time_series(daily_status),
+    ], rows=len(daily_status))
+    timed(results, size, 'chart_serialize', lambda: [fig.to_json() for fig in figures], rows=len(daily_status))
+
+
+def compare(results, baseline_path):
+    """Печатает отношение времени к предыдущему прогону"""
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = {(item['size'], item['stage']): item['seconds'] for item in json.load(f)['results']}
+    print("\nСравнение с базовым прогоном:")
+    for item in results:
+        previous = baseline.get((item['size'], item['stage']))
+        if previous:
+            print(f"{item['size']:>9} {item['stage']:<28} x{item['seconds'] / previous:6.2f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Замеры производительности на синтетических данных")
+    parser.add_argument("--sizes", type=int, nargs='+', default=DEFAULT_SIZES,
+                        help="число строк в каждом источнике (например 10000 100000 1000000 5000000)")
+    parser.add_argument("--days", type=int, default=120, help="глубина синтетических данных в днях")
+    parser.add_argument("--output", default="bench_results.json", help="файл с результатами в формате JSON")
+    parser.add_argument("--workdir", default=None,
+                        help="каталог для данных (по умолчанию временный; сгенерированные файлы переиспользуются)")
+    parser.add_argument("--baseline", default=None, help="результаты предыдущего прогона для сравнения")
+    args = parser.parse_args(argv)
+
+    temp_dir = None
+    workdir = args.workdir
+    if workdir is None:
+        temp_dir = tempfile.TemporaryDirectory(prefix="km_bench_")
+        workdir = temp_dir.name
+    os.makedirs(workdir, exist_ok=True)
+    # Логи замеров не смешиваются с логами дашборда
+    os.environ.setdefault('LOG_DIR', os.path.join(workdir, 'logs'))
+
+    results = []
+    memory = []
+    try:
+        for size in args.sizes:
+            bench_size(size, workdir, args.days, results, memory)
+    finally:
+        if temp_dir is not None:
+            temp_dir.cleanup()
+
+    import pandas as pd
+    report = {
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'revision': _git_revision(),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'platform': platform.platform(),
+        'sizes': args.sizes,
+        'days': args.days,
+        'results': results,
+        'memory': memory,
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"Результаты записаны в {args.output}")
+
+    if args.baseline:
+        compare(results, args.baseline)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
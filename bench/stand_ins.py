@@ -0,0 +1,120 @@
+import os
+import re
+from contextlib import contextmanager
+from datetime import datetime
+from ftplib import error_perm
+from gspread.utils import a1_to_rowcol
+
+
+class LocalFTP:
+    """Заглушка ftplib.FTP, отдающая файлы из локального каталога.
+
+    Поддерживает команды, которые использует FTPExcelReader: SIZE, MDTM,
+    NLST и RETR с REST.
+    """
+
+    root = "."
+
+    def __init__(self, host=None, *args, **kwargs):
+        self.host = host
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def login(self, user=None, passwd=None):
+        return "230 Login successful"
+
+    def _path(self, filename):
+        path = os.path.join(self.root, os.path.basename(filename))
+        if not os.path.isfile(path):
+            raise error_perm(f"550 {filename}: No such file")
+        return path
+
+    def voidcmd(self, command):
+        return "200 OK"
+
+    def sendcmd(self, command):
+        verb, _, argument = command.partition(' ')
+        if verb.upper() == "MDTM":
+            mtime = os.path.getmtime(self._path(argument))
+            return f"213 {datetime.utcfromtimestamp(mtime).strftime('%Y%m%d%H%M%S')}"
+        raise error_perm(f"502 {verb} not implemented")
+
+    def size(self, filename):
+        return os.path.getsize(self._path(filename))
+
+    def nlst(self, *args):
+        return sorted(os.listdir(self.root))
+
+    def retrbinary(self, command, callback, blocksize=8192, rest=None):
+        path = self._path(command.split(' ', 1)[1])
+        with open(path, 'rb') as f:
+            if rest:
+                f.seek(int(rest))
+            while True:
+                block = f.read(blocksize)
+                if not block:
+                    break
+                callback(block)
+        return "226 Transfer complete"
+
+
+@contextmanager
+def local_ftp(root):
+    """Подменяет FTP в ftp_excel_reader на LocalFTP с каталогом root"""
+    import ftp_excel_reader
+
+    original = ftp_excel_reader.FTP
+    stand_in = type("LocalFTP", (LocalFTP,), {"root": root})
+    ftp_excel_reader.FTP = stand_in
+    try:
+        yield stand_in
+    finally:
+        ftp_excel_reader.FTP = original
+
+
+class FakeWorksheet:
+    """Заглушка листа gspread поверх списка строк (первая строка - заголовок)"""
+
+    def __init__(self, values):
+        self.values = values
+        self.requests = 0
+
+    def get_all_values(self):
+        self.requests += 1
+        return [list(row) for row in self.values]
+
+    def row_values(self, row):
+        self.requests += 1
+        values = list(self.values[row - 1]) if row <= len(self.values) else []
+        while values and not values[-1]:
+            values.pop()
+        return values
+
+    def _bound(self, cell, default_row, default_col):
+        match = re.match(r'^([A-Z]*)(\d*)$', cell)
+        col = a1_to_rowcol(f"{match.group(1)}1")[1] if match.group(1) else default_col
+        row = int(match.group(2)) if match.group(2) else default_row
+        return row, col
+
+    def _range(self, a1_range, major_dimension='ROWS'):
+        start, _, end = a1_range.partition(':')
+        width = max((len(row) for row in self.values), default=0)
+        first_row, first_col = self._bound(start, 1, 1)
+        last_row, last_col = self._bound(end or start, len(self.values), width)
+        rows = [list(row[first_col - 1:last_col]) for row in self.values[first_row - 1:last_row]]
+        vectors = [list(column) for column in zip(*rows)] if major_dimension == 'COLUMNS' else rows
+        # Как и Sheets API, обрезаем пустые ячейки в конце каждого вектора и пустые векторы в конце
+        for vector in vectors:
+            while vector and not vector[-1]:
+                vector.pop()
+        while vectors and not vectors[-1]:
+            vectors.pop()
+        return vectors
+
+    def batch_get(self, ranges, major_dimension='ROWS', **kwargs):
+        self.requests += 1
+        return [self._range(a1_range, major_dimension) for a1_range in ranges]
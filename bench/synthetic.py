@@ -0,0 +1,80 @@
+from datetime import datetime
+import numpy as np
+import pandas as pd
+import openpyxl
+
+# Написания филиалов, встречающиеся в выгрузке 1С (включая неизвестное)
+EXCEL_BRANCH_SPELLINGS = [
+    "шахри Худжанд",
+    "шаҳри Худжанд",
+    "нохияи Спитамен",
+    "нохиаи Спитамен",
+    "нохияи Ч. Расулов",
+    "Ч. Расулов",
+    "шахри Панчакент",
+    "Панчакент",
+    "ООО Неизвестный филиал",
+]
+
+SCORING_BRANCHES = ["Худжанд", "Спитамен", "Пенджикент", "Джаббор Расулов"]
+SCORING_RESULTS = ["Одобрено", "Отказано"]
+
+# Форматы текстовых дат в выгрузке 1С; None - ячейка Excel с типом дата
+EXCEL_DATE_FORMATS = [None, '%d.%m.%Y %H:%M:%S', '%m/%d/%Y %I:%M:%S %p', '%Y-%m-%d %H:%M:%S']
+
+
+def random_dates(rng, rows, days_back, now=None):
+    """Случайные даты за последние days_back дней"""
+    now = now or datetime.now()
+    offsets = pd.to_timedelta(rng.integers(0, days_back * 24 * 3600, rows), unit='s')
+    return (pd.Timestamp(now) - offsets).floor('s')
+
+
+def scoring_values(rows, days_back=120, seed=0):
+    """Значения листа Scoring (заголовок и строки) в том виде, в каком их отдает gspread"""
+    rng = np.random.default_rng(seed)
+    dates = random_dates(rng, rows, days_back).sort_values()
+    columns = {
+        'Дата': dates.strftime('%Y-%m-%d %H:%M:%S'),
+        'Результат': rng.choice(SCORING_RESULTS, rows, p=[0.6, 0.4]),
+        'Филиал': rng.choice(SCORING_BRANCHES, rows),
+        'Менеджер': rng.choice([f"Менеджер {i}" for i in range(30)], rows),
+        'Клиент': [f"Клиент {i}" for i in rng.integers(0, rows, rows)],
+        'Сумма': rng.integers(1000, 50000, rows).astype(str),
+    }
+    header = list(columns)
+    body = np.column_stack([np.asarray(values, dtype=object) for values in columns.values()]).tolist()
+    return [header] + body
+
+
+def excel_frame(rows, days_back=120, seed=1):
+    """Выгрузка 1С со смешанными форматами дат и разными написаниями филиалов"""
+    rng = np.random.default_rng(seed)
+    dates = random_dates(rng, rows, days_back)
+    formats = rng.integers(0, len(EXCEL_DATE_FORMATS), rows)
+
+    date_values = pd.Series(dates.to_pydatetime(), dtype=object)
+    for position, date_format in enumerate(EXCEL_DATE_FORMATS):
+        mask = formats == position
+        if date_format is not None and mask.any():
+            date_values[mask] = dates[mask].strftime(date_format)
+
+    return pd.DataFrame({
+        'Дата': date_values,
+        'Номер': [f"КМ-{i:08d}" for i in range(rows)],
+        'Организация': rng.choice(EXCEL_BRANCH_SPELLINGS, rows),
+        'Партнер': [f"Клиент {i}" for i in rng.integers(0, rows, rows)],
+        'Сумма документа': rng.integers(1000, 50000, rows),
+        'Комментарий': rng.choice(["", "Повторная заявка", "Перенос"], rows),
+    })
+
+
+def write_excel(df, path):
+    """Записывает выгрузку 1С в .xlsx потоково"""
+    workbook = openpyxl.Workbook(write_only=True)
+    worksheet = workbook.create_sheet()
+    worksheet.append(list(df.columns))
+    for row in df.itertuples(index=False, name=None):
+        worksheet.append(row)
+    workbook.save(path)
+    return path
@@ -0,0 +1,88 @@
+import numpy as np
+import pandas as pd
+from logger_config import setup_logger
+
+logger = setup_logger('branch_normalizer')
+
+# Словарь соответствия названий
+BRANCH_MAPPING = {
+    "нохияи Спитамен": "Спитамен",
+    "нохиаи Спитамен": "Спитамен",
+    "нохияи Ч. Расулов": "Джаббор Расулов",
+    "нохиаи Ч. Расулов": "Джаббор Расулов",
+    "Ч. Расулов": "Джаббор Расулов",
+    "шахри Панчакент": "Пенджикент",
+    "шаҳри Панчакент": "Пенджикент",
+    "Панчакент": "Пенджикент",
+    "шахри Худжанд": "Худжанд",
+    "шаҳри Худжанд": "Худжанд",
+}
+
+
+class BranchNormalizer:
+    """Нормализация названий филиалов с мемоизацией.
+
+    Правила сопоставления подготавливаются один раз, каждое уникальное исходное
+    значение обрабатывается один раз за время жизни процесса, а колонка
+    возвращается как pandas Categorical.
+    """
+
+    def __init__(self, mapping=None):
+        mapping = BRANCH_MAPPING if mapping is None else mapping
+        # Правила в нижнем регистре, порядок совпадает с порядком словаря
+        self._rules = [(key.lower(), value) for key, value in mapping.items()]
+        self._canonical = set(mapping.values())
+        self._memo = {}
+
+    def normalize_value(self, branch_name):
+        """Возвращает (нормализованное название, известно ли название)"""
+        if not isinstance(branch_name, str):
+            return branch_name, True
+
+        cached = self._memo.get(branch_name)
+        if cached is not None:
+            return cached
+
+        result = (branch_name, branch_name in self._canonical)
+        if not result[1]:
+            branch_name_lower = branch_name.lower()
+            for key, value in self._rules:
+                if key in branch_name_lower:
+                    result = (value, True)
+                    break
+
+        self._memo[branch_name] = result
+        return result
+
+    def normalize(self, branches, source="данных"):
+        """Нормализует колонку филиалов и возвращает её как Categorical"""
+        codes, uniques = pd.factorize(branches)
+
+        normalized = []
+        unknown = []
+        for position, raw_name in enumerate(uniques):
+            name, known = self.normalize_value(raw_name)
+            normalized.append(name)
+            if not known:
+                unknown.append(position)
+
+        # Несколько исходных написаний могут давать одно название филиала
+        target_codes, categories = pd.factorize(pd.Series(normalized, dtype=object))
+        new_codes = np.where(codes >= 0, target_codes[np.maximum(codes, 0)], -1) if len(uniques) else codes
+        result = pd.Series(
+            pd.Categorical.from_codes(new_codes, categories=categories),
+            index=branches.index,
+            name=branches.name,
+        )
+
+        logger.info(f"Нормализация филиалов {source}: {len(uniques)} написаний -> {len(categories)} филиалов")
+        if unknown:
+            counts = np.bincount(codes[codes >= 0], minlength=len(uniques))
+            summary = {uniques[position]: int(counts[position]) for position in unknown}
+            logger.warning(f"Неизвестные названия филиалов {source}: {summary}")
+
+        return result
+
+
+# Общий экземпляр, чтобы таблица мемоизации сохранялась между файлами
+branch_normalizer = BranchNormalizer()
@@ -2,13 +2,42 @@ import json
 from datetime import datetime, timedelta
 import os
 import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
 from logger_config import setup_logger
+from perf import span
+from file_lock import FileLock, atomic_path
 
 logger = setup_logger('cache_manager')
 
+# Ключ метаданных Arrow, в котором хранится дата снимка
+CACHE_DATE_KEY = b'cache_date'
+
+def to_arrow_table(df, metadata=None):
+    """Преобразует DataFrame в таблицу Arrow с дополнительными метаданными"""
+    try:
+        table = pa.Table.from_pandas(df, preserve_index=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError) as e:
+        # Колонки Excel со смешанными типами храним как строки
+        logger.warning(f"Смешанные типы в колонках, приводим к строкам: {str(e)}")
+        df = df.copy()
+        for column in df.columns:
+            if df[column].dtype == object:
+                df[column] = df[column].where(df[column].isna(), df[column].astype(str))
+        table = pa.Table.from_pandas(df, preserve_index=False)
+
+    if metadata:
+        merged = dict(table.schema.metadata or {})
+        merged.update(metadata)
+        table = table.replace_schema_metadata(merged)
+    return table
+
 class CacheManager:
-    def __init__(self, cache_file="cache/yesterday_data.json"):
+    def __init__(self, cache_file="cache/yesterday_data.feather",
+                 legacy_file="cache/yesterday_data.json", memory_map=True):
         self.cache_file = cache_file
+        self.legacy_file = legacy_file
+        self.memory_map = memory_map
         try:
             os.makedirs(os.path.dirname(cache_file), exist_ok=True)
             logger.info(f"Инициализирован CacheManager с файлом: {cache_file}")
@@ -16,79 +45,122 @@ class CacheManager:
             logger.error(f"Ошибка при создании директории кэша: {str(e)}")
             raise
 
+    def _write_snapshot(self, df, cache_date):
+        """Записывает колоночный снимок на диск"""
+        if 'Дата' in df.columns and not pd.api.types.is_datetime64_any_dtype(df['Дата']):
+            df = df.copy()
+            df['Дата'] = pd.to_datetime(df['Дата'])
+
+        table = to_arrow_table(df, {CACHE_DATE_KEY: cache_date.encode('utf-8')})
+        # Читатели других процессов не видят недописанный файл
+        with atomic_path(self.cache_file) as temp_path:
+            feather.write_feather(table, temp_path)
+
     def save_data(self, data):
         """Сохраняет данные за текущий день как вчерашние"""
         try:
             logger.info("Начало сохранения данных в кэш")
 
-            def convert_timestamps(obj):
-                if isinstance(obj, (pd.Timestamp, datetime)):
-                    return obj.strftime('%Y-%m-%d %H:%M:%S')
-                if isinstance(obj, pd.Series):
-                    return obj.to_dict()
-                if isinstance(obj, pd.DataFrame):
-                    return obj.to_dict(orient='records')
-                return obj
-
-            # Преобразуем DataFrame в словарь
-            if isinstance(data, pd.DataFrame):
-                data = data.to_dict(orient='list')
-
-            # Конвертируем все временные метки
-            processed_data = {}
-            for key, value in data.items():
-                if isinstance(value, list):
-                    processed_data[key] = [convert_timestamps(item) for item in value]
-                else:
-                    processed_data[key] = convert_timestamps(value)
-
-            cache_data = {
-                'date': (datetime.now() - timedelta(days=1)).strftime('%Y-%m-%d'),
-                'data': processed_data
-            }
-
-            with open(self.cache_file, 'w', encoding='utf-8') as f:
-                json.dump(cache_data, f, ensure_ascii=False)
-
-            logger.info("Данные успешно сохранены в кэш")
+            if not isinstance(data, pd.DataFrame):
+                data = pd.DataFrame(data)
+
+            cache_date = (datetime.now() - timedelta(days=1)).strftime('%Y-%m-%d')
+            with span('cache.save', rows=len(data)) as s:
+                self._write_snapshot(data, cache_date)
+                s.set(bytes=os.path.getsize(self.cache_file))
+
+            logger.info(f"Данные успешно сохранены в кэш: {len(data)} строк")
 
         except Exception as e:
             logger.error(f"Ошибка при сохранении данных в кэш: {str(e)}")
             raise
 
+    @property
+    def lock_path(self):
+        return f"{self.cache_file}.lock"
+
+    def get_or_fetch(self, fetch, timeout=600):
+        """Данные из кэша или из fetch() с сохранением в кэш.
+
+        Загрузку выполняет один процесс: остальные ждут на блокировке и после
+        её снятия читают уже сохраненный кэш. Возвращает DataFrame и признак
+        попадания в кэш.
+        """
+        data = self.get_yesterday_data()
+        if data is not None:
+            return data, True
+
+        with FileLock(self.lock_path, timeout=timeout):
+            # Пока ждали блокировку, кэш мог заполнить другой процесс
+            data = self.get_yesterday_data()
+            if data is not None:
+                logger.info("Кэш заполнен другим процессом, повторная загрузка не нужна")
+                return data, True
+
+            data = fetch()
+            self.save_data(data)
+            return data, False
+
+    def migrate_legacy_json(self):
+        """Однократно переносит старый JSON-кэш в колоночный формат"""
+        if not os.path.exists(self.legacy_file):
+            return False
+
+        logger.info(f"Найден старый JSON-кэш, выполняем миграцию: {self.legacy_file}")
+        with open(self.legacy_file, 'r', encoding='utf-8') as f:
+            cache_data = json.load(f)
+
+        df = pd.DataFrame(cache_data['data'])
+        if 'Дата' in df.columns:
+            df['Дата'] = pd.to_datetime(df['Дата'], format='%Y-%m-%d %H:%M:%S')
+
+        self._write_snapshot(df, cache_data['date'])
+        os.replace(self.legacy_file, f"{self.legacy_file}.migrated")
+        logger.info(f"Миграция кэша завершена: {len(df)} строк")
+        return True
+
     def get_yesterday_data(self):
         """Получает данные за вчерашний день из кэша"""
+        with span('cache.load') as s:
+            df = self._read_yesterday_data()
+            if df is None:
+                s.set(cache='miss')
+            else:
+                s.set(cache='hit', rows=len(df), bytes=os.path.getsize(self.cache_file))
+        return df
+
+    def _read_yesterday_data(self):
         try:
             logger.info("Попытка получения данных из кэша")
 
-            with open(self.cache_file, 'r', encoding='utf-8') as f:
-                cache_data = json.load(f)
-                cache_date = datetime.strptime(cache_data['date'], '%Y-%m-%d').date()
-                yesterday = (datetime.now() - timedelta(days=1)).date()
-
-                if cache_date == yesterday:
-                    logger.info("Найдены актуальные данные в кэше")
-                    data = cache_data['data']
-                    # Преобразуем строки дат обратно в datetime
-                    if 'Дата' in data:
-                        try:
-                            data['Дата'] = [pd.to_datetime(d) if d is not None else None for d in data['Дата']]
-                            logger.info("Даты успешно преобразованы в datetime")
-                        except Exception as e:
-                            logger.error(f"Ошибка при преобразовании дат: {str(e)}")
-                            # Если не удалось преобразовать даты, возвращаем None
-                            return None
-                    return data
-                else:
-                    logger.info(f"Данные в кэше устарели. Дата кэша: {cache_date}, требуется: {yesterday}")
-                    return None
+            if not os.path.exists(self.cache_file):
+                try:
+                    self.migrate_legacy_json()
+                except Exception as e:
+                    logger.error(f"Ошибка при миграции JSON-кэша: {str(e)}")
+
+            table = feather.read_table(self.cache_file, memory_map=self.memory_map)
+            metadata = table.schema.metadata or {}
+            if CACHE_DATE_KEY not in metadata:
+                logger.warning("В снимке кэша отсутствует дата")
+                return None
+
+            cache_date = datetime.strptime(metadata[CACHE_DATE_KEY].decode('utf-8'), '%Y-%m-%d').date()
+            yesterday = (datetime.now() - timedelta(days=1)).date()
+
+            if cache_date == yesterday:
+                logger.info("Найдены актуальные данные в кэше")
+                return table.to_pandas()
+            else:
+                logger.info(f"Данные в кэше устарели. Дата кэша: {cache_date}, требуется: {yesterday}")
+                return None
 
         except FileNotFoundError:
             logger.warning("Файл кэша не найден")
             return None
-        except json.JSONDecodeError as e:
-            logger.error(f"Ошибка декодирования JSON: {str(e)}")
+        except pa.ArrowInvalid as e:
+            logger.error(f"Ошибка чтения снимка кэша: {str(e)}")
             return None
         except Exception as e:
             logger.error(f"Непредвиденная ошибка при получении данных из кэша: {str(e)}")
-            return None
\ No newline at end of file
+            return None
@@ -0,0 +1,70 @@
+from html import escape
+
+# Шаблоны карточек разбираются один раз при импорте; строки без отступов,
+# чтобы Markdown не принял HTML за блок кода
+_STAT_ITEM = '<div class="stat-item"><div class="stat-value{css}"{style}>{value}</div><div class="stat-label">{label}</div></div>'
+
+_CARD = '<div class="branch-card"><div class="branch-name">{name}</div><div class="stats-container">{items}</div></div>'
+
+_GRID = '<div class="card-grid">\n{cards}\n</div>'
+
+
+def _stat(value, label, css="", style=""):
+    return _STAT_ITEM.format(value=value, label=label, css=f" {css}" if css else "",
+                             style=f' style="{style}"' if style else "")
+
+
+def _grid(cards):
+    return _GRID.format(cards="\n".join(cards)) if cards else ""
+
+
+def branch_cards_html(branch_metrics):
+    """Карточки филиалов по таблице метрик (total, approved, rejected, approval_rate)"""
+    cards = [
+        _CARD.format(name=escape(str(branch)), items="".join((
+            _stat(f"{total:.0f}", "ВСЕГО ЗАЯВОК", "total"),
+            _stat(f"{approved:.0f}", "ОДОБРЕНО", "approved"),
+            _stat(f"{rejected:.0f}", "ОТКАЗАНО", "rejected"),
+            _stat(f"{rate:.1f}%", "ПРОЦЕНТ ОДОБРЕНИЯ", "approval-rate"),
+        )))
+        for branch, total, approved, rejected, rate in zip(
+            branch_metrics.index, branch_metrics['total'], branch_metrics['approved'],
+            branch_metrics['rejected'], branch_metrics['approval_rate'])
+    ]
+    return _grid(cards)
+
+
+def comparison_cards_html(comparison_data):
+    """Карточки сравнения источников (total, scoring, excel, share)"""
+    cards = [
+        _CARD.format(name=escape(str(branch)), items="".join((
+            _stat(f"{total:.0f}", "ВСЕГО ЗАЯВОК", "total"),
+            _stat(f"{scoring:.0f}", "ЧЕРЕЗ СКОРИНГ", "approved"),
+            _stat(f"{excel:.0f}", "ЧЕРЕЗ 1С", "rejected"),
+            _stat(f"{share:.1f}%", "ДОЛЯ СКОРИНГА", "approval-rate"),
+        )))
+        for branch, total, scoring, excel, share in zip(
+            comparison_data.index, comparison_data['total'], comparison_data['scoring'],
+            comparison_data['excel'], comparison_data['share'])
+    ]
+    return _grid(cards)
+
+
+def day_comparison_cards_html(day_comparison):
+    """Карточки сравнения с предыдущим днем (результат compare_days)"""
+    cards = []
+    for branch, total_today, total_yesterday, change, rate_today, rate_yesterday in zip(
+            day_comparison.index, day_comparison['total_today'], day_comparison['total_yesterday'],
+            day_comparison['change'], day_comparison['approval_rate_today'],
+            day_comparison['approval_rate_yesterday']):
+        change = int(change)
+        change_color = 'green' if change > 0 else 'red' if change < 0 else '#666'
+        change_symbol = '↑' if change > 0 else '↓' if change < 0 else '='
+        cards.append(_CARD.format(name=escape(str(branch)), items="".join((
+            _stat(f"{total_today:.0f}", "СЕГОДНЯ (ВСЕГО)", "total"),
+            _stat(f"{total_yesterday:.0f}", "ВЧЕРА (ВСЕГО)", "total"),
+            _stat(f"{change_symbol} {abs(change)}", "ИЗМЕНЕНИЕ", style=f"color: {change_color}"),
+            _stat(f"{rate_today:.1f}%", "СЕГОДНЯ (% ОДОБРЕНИЯ)", "approval-rate"),
+            _stat(f"{rate_yesterday:.1f}%", "ВЧЕРА (% ОДОБРЕНИЯ)", "approval-rate"),
+        ))))
+    return _grid(cards)
@@ -1,16 +1,28 @@
+import os
 import streamlit as st
 import pandas as pd
-import plotly.express as px
 from datetime import datetime, timedelta
-import gspread
-from read_json import response_json
-from ftp_excel_reader import FTPExcelReader
-from cache_manager import CacheManager
+from data_cache import data_cache
+from figure_cache import figure_cache
+from snapshot_store import SnapshotStore, SnapshotReader
+from time_index import period_slice
+from tiering import weekly_trend
+from metrics import MetricsCube, compare_days, compare_sources, branch_stats_table
 from logger_config import setup_logger
+from perf import perf, span
+from cards import branch_cards_html, comparison_cards_html, day_comparison_cards_html
 
 # Инициализация логгера
 logger = setup_logger('dashboard')
 
+# Режим фонового обновления: thread - поток внутри процесса Streamlit,
+# external - отдельный процесс refresher.py
+REFRESHER_MODE = os.getenv("REFRESHER_MODE", "thread")
+# Как часто проверять появление нового снимка, в секундах
+SNAPSHOT_POLL_SECONDS = int(os.getenv("SNAPSHOT_POLL_SECONDS", "30"))
+# Сколько последних замеров учитывать в панели производительности
+PERF_PANEL_RECORDS = int(os.getenv("PERF_PANEL_RECORDS", "300"))
+
 # Настройка страницы
 st.set_page_config(layout="wide")
 
@@ -126,60 +138,14 @@ COLOR_SCHEME = {
     "Отказано": "#dc3545"
 }
 
-def get_scoring_data():
-    """Получение данных из Google Sheets"""
-    try:
-        response_ = response_json()
-        sa = gspread.service_account_from_dict(response_)
-
-        sh = sa.open("KreditMarket")
-        worksheet = sh.worksheet("Scoring")
-
-        data = worksheet.get_all_records()
-        df = pd.DataFrame(data)
-
-        # Проверяем формат даты и времени в данных
-        print("Sample date from data:", df['Дата'].iloc[0] if not df.empty else "No data")
-
-        # Принудительно преобразуем строки даты в datetime
-        try:
-            # Пробуем стандартный формат
-            df['Дата'] = pd.to_datetime(df['Дата'], format='%Y-%m-%d %H:%M:%S')
-        except:
-            try:
-                # Если не получилось, пробуем альтернативный формат
-                df['Дата'] = pd.to_datetime(df['Дата'], format='%d.%m.%Y %H:%M:%S')
-            except:
-                # Если и это не сработало, пробуем автоматическое определение формата
-                df['Дата'] = pd.to_datetime(df['Дата'], infer_datetime_format=True)
-
-        # Проверяем успешность преобразования
-        if not pd.api.types.is_datetime64_any_dtype(df['Дата']):
-            raise ValueError("Failed to convert date column to datetime")
-
-        return df
-    except Exception as e:
-        st.error(f"Ошибка при загрузке данных: {str(e)}")
-        st.error("Пример формата даты из данных: " + str(df['Дата'].iloc[0] if not df.empty else "Нет данных"))
-        raise e
-
-def get_status_metrics(data):
-    """Расчет метрик по статусам"""
-    total = len(data)
-    approved = len(data[data['Результат'] == 'Одобрено'])
-    rejected = len(data[data['Результат'] == 'Отказано'])
-    approval_rate = (approved / total * 100) if total > 0 else 0
-
-    return {
-        'total': total,
-        'approved': approved,
-        'rejected': rejected,
-        'approval_rate': approval_rate
-    }
-
-def create_status_pie_chart(data):
+def get_scoring_cube():
+    """Куб агрегатов скоринга, общий для всех сессий"""
+    return data_cache.get_or_load('scoring_cube', MetricsCube, ttl=float('inf'))
+
+def create_status_pie_chart(status_counts):
     """Создание круговой диаграммы"""
-    status_counts = data['Результат'].value_counts()
+    # plotly загружается при первом построении графика, а не при старте процесса
+    import plotly.express as px
     fig = px.pie(
         values=status_counts.values,
         names=status_counts.index,
@@ -188,9 +154,9 @@ def create_status_pie_chart(data):
     )
     return fig
 
-def create_bar_chart(data, x_column, title):
+def create_bar_chart(status_data, title):
     """Создание столбчатой диаграммы"""
-    status_data = pd.crosstab(data[x_column], data['Результат'])
+    import plotly.express as px
     fig = px.bar(
         status_data,
         barmode='group',
@@ -199,9 +165,9 @@ def create_bar_chart(data, x_column, title):
     )
     return fig
 
-def create_time_series(data):
+def create_time_series(daily_status):
     """Создание графика временного ряда"""
-    daily_status = data.groupby([data['Дата'].dt.date, 'Результат']).size().unstack(fill_value=0)
+    import plotly.express as px
     fig = px.line(
         daily_status,
         title="Динамика заявок по дням",
@@ -209,137 +175,70 @@ def create_time_series(data):
     )
     return fig
 
-def display_branch_cards(data, title):
+def create_trend_chart(weekly):
+    """График долгосрочной динамики по дневным итогам"""
+    import plotly.express as px
+    fig = px.line(
+        weekly,
+        title="Заявки по неделям за всю историю"
+    )
+    return fig
+
+def display_branch_cards(branch_metrics, title):
     st.subheader(title)
-    if len(data) == 0:
+    if len(branch_metrics) == 0:
         st.info(f"Нет данных {title.lower()}")
         return
 
-    for branch in data['Филиал'].unique():
-        branch_data = data[data['Филиал'] == branch]
-        metrics = get_status_metrics(branch_data)
-
-        st.markdown(f"""
-            <div class="branch-card">
-                <div class="branch-name">{branch}</div>
-                <div class="stats-container">
-                    <div class="stat-item">
-                        <div class="stat-value total">{metrics['total']}</div>
-                        <div class="stat-label">ВСЕГО ЗАЯВОК</div>
-                    </div>
-                    <div class="stat-item">
-                        <div class="stat-value approved">{metrics['approved']}</div>
-                        <div class="stat-label">ОДОБРЕНО</div>
-                    </div>
-                    <div class="stat-item">
-                        <div class="stat-value rejected">{metrics['rejected']}</div>
-                        <div class="stat-label">ОТКАЗАНО</div>
-                    </div>
-                    <div class="stat-item">
-                        <div class="stat-value approval-rate">{metrics['approval_rate']:.1f}%</div>
-                        <div class="stat-label">ПРОЦЕНТ ОДОБРЕНИЯ</div>
-                    </div>
-                </div>
-            </div>
-        """, unsafe_allow_html=True)
+    # Все карточки раздела отправляются одним элементом
+    st.markdown(branch_cards_html(branch_metrics), unsafe_allow_html=True)
 
-def get_combined_data():
-    """Получение и объединение данных из скоринга и 1С"""
-    try:
-        logger.info("Начало получения комбинированных данных")
-
-        # Получаем данные скоринга
-        scoring_df = get_scoring_data()
-
-        # Получаем данные 1С
-        cache_manager = CacheManager()
-        cached_1c_data = cache_manager.get_yesterday_data()
-
-        if cached_1c_data is None:
-            logger.info("Данные 1С не найдены в кэше, загружаем с FTP")
-            # Если нет в кэше, загружаем с FTP
-            ftp_reader = FTPExcelReader()
-            excel_df = ftp_reader.read_excel()
-            cache_manager.save_data(excel_df)
-        else:
-            logger.info("Загружаем данные 1С из кэша")
-            excel_df = pd.DataFrame(cached_1c_data)
-            # Преобразуем колонку даты в datetime
-            try:
-                excel_df['Дата'] = pd.to_datetime(excel_df['Дата'])
-                logger.info("Колонка 'Дата' успешно преобразована в datetime")
-            except Exception as e:
-                logger.error(f"Ошибка при преобразовании колонки 'Дата': {str(e)}")
-                raise
-
-        logger.info(f"Получено записей из скоринга: {len(scoring_df) if scoring_df is not None else 0}")
-        logger.info(f"Получено записей из 1С: {len(excel_df) if excel_df is not None else 0}")
-
-        return scoring_df, excel_df
-    except Exception as e:
-        logger.error(f"Ошибка при получении данных: {str(e)}")
-        st.error(f"Ошибка при получении данных: {str(e)}")
-        return None, None
+def display_perf_panel():
+    """Сводка последних замеров производительности в боковой панели"""
+    if not st.sidebar.checkbox("Замеры производительности", key="perf_panel"):
+        return
 
-def display_comparison_stats(scoring_data, excel_data, period_suffix):
+    records = perf.read_recent(PERF_PANEL_RECORDS)
+    if not records:
+        st.sidebar.info("Замеров пока нет")
+        return
+
+    spans = pd.DataFrame(records)
+    for column in ('rows', 'bytes', 'cache'):
+        if column not in spans.columns:
+            spans[column] = None
+
+    summary = spans.groupby('name').agg(
+        count=('seconds', 'size'),
+        last=('seconds', 'last'),
+        median=('seconds', 'median'),
+        max=('seconds', 'max'),
+        rows=('rows', 'last'),
+        bytes=('bytes', 'last'),
+    )
+    cached = spans.dropna(subset=['cache'])
+    summary['cache_hits'] = cached.groupby('name')['cache'].agg(lambda c: f"{(c == 'hit').sum()}/{len(c)}")
+    st.sidebar.dataframe(summary.sort_values('last', ascending=False), use_container_width=True)
+
+def get_snapshot_reader():
+    """Читатель опубликованных снимков, общий для всех сессий"""
+    return data_cache.get_or_load(
+        'snapshot_reader',
+        lambda: SnapshotReader(SnapshotStore(), SNAPSHOT_POLL_SECONDS),
+        ttl=float('inf')
+    )
+
+def display_comparison_stats(scoring_metrics, excel_data, period_suffix):
     """Отображение сравнительной статистики по источникам заявок"""
     try:
         logger.info("Начало отображения сравнительной статистики")
 
-        # Убедимся, что даты в правильном формате
-        if not pd.api.types.is_datetime64_any_dtype(excel_data['Дата']):
-            logger.warning("Преобразование колонки 'Дата' в datetime для данных 1С")
-            excel_data['Дата'] = pd.to_datetime(excel_data['Дата'])
-
-        comparison_data = []
-
-        unique_branches = set(scoring_data['Филиал'].unique()) | set(excel_data['Филиал'].unique())
-        logger.info(f"Найдено уникальных филиалов: {len(unique_branches)}")
-
-        for branch in unique_branches:
-            scoring_count = len(scoring_data[scoring_data['Филиал'] == branch])
-            excel_count = len(excel_data[excel_data['Филиал'] == branch])
-
-            total = scoring_count + excel_count
-            scoring_share = (scoring_count / total * 100) if total > 0 else 0
-
-            # Создаем запись для филиала
-            entry = {
-                'branch': branch,
-                'scoring': scoring_count,
-                'excel': excel_count,
-                'total': total,
-                'share': f"{scoring_share:.1f}%"
-            }
-            comparison_data.append(entry)
-
-        logger.info("Подготовлены данные для отображения")
-
-        # Отображаем статистику в виде карточек
-        for entry in comparison_data:
-            st.markdown(f"""
-                <div class="branch-card">
-                    <div class="branch-name">{entry['branch']}</div>
-                    <div class="stats-container">
-                        <div class="stat-item">
-                            <div class="stat-value total">{entry['total']}</div>
-                            <div class="stat-label">ВСЕГО ЗАЯВОК</div>
-                        </div>
-                        <div class="stat-item">
-                            <div class="stat-value approved">{entry['scoring']}</div>
-                            <div class="stat-label">ЧЕРЕЗ СКОРИНГ</div>
-                        </div>
-                        <div class="stat-item">
-                            <div class="stat-value rejected">{entry['excel']}</div>
-                            <div class="stat-label">ЧЕРЕЗ 1С</div>
-                        </div>
-                        <div class="stat-item">
-                            <div class="stat-value approval-rate">{entry['share']}</div>
-                            <div class="stat-label">ДОЛЯ СКОРИНГА</div>
-                        </div>
-                    </div>
-                </div>
-            """, unsafe_allow_html=True)
+        # Количество заявок по обоим источникам за один проход
+        comparison_data = compare_sources(scoring_metrics['total'], excel_data['Филиал'].value_counts())
+        logger.info(f"Найдено уникальных филиалов: {len(comparison_data)}")
+
+        # Отображаем статистику в виде карточек одним элементом
+        st.markdown(comparison_cards_html(comparison_data), unsafe_allow_html=True)
 
         logger.info("Сравнительная статистика успешно отображена")
 
@@ -350,9 +249,32 @@ def display_comparison_stats(scoring_data, excel_data, period_suffix):
 def main():
     st.markdown('<div class="main-header"><h1>Дашборд скоринга Kredit Market</h1></div>', unsafe_allow_html=True)
 
+    if REFRESHER_MODE == "thread":
+        # Источники данных (gspread, FTP) импортируются уже в фоновом потоке
+        from refresher import start_background_refresher
+        start_background_refresher()
+
+    # Замеры участков отрисовки: каждый mark закрывает участок с предыдущей отметки
+    sections = perf.sections('render')
+
+    # Страница только читает опубликованный снимок; загрузка из источников выполняется в фоне
+    reader = get_snapshot_reader()
+    if st.sidebar.button("Обновить данные"):
+        reader.store.request_refresh()
+        reader.invalidate()
+
     try:
-        # Получаем данные из обоих источников
-        scoring_df, excel_df = get_combined_data()
+        snapshot = reader.get()
+        sections.mark('snapshot')
+        if snapshot is None:
+            st.info("Данные загружаются фоновым обновлением. Обновите страницу через несколько секунд.")
+            return
+
+        scoring_df, excel_df = snapshot.scoring_df, snapshot.excel_df
+        st.caption(f"Данные обновлены: {snapshot.refreshed_at.strftime('%d.%m.%Y %H:%M:%S')}")
+        if snapshot.partial:
+            failed = ", ".join(f"{source}: {error}" for source, error in snapshot.errors.items())
+            st.warning(f"Часть источников не обновилась, показаны прошлые данные ({failed})")
 
         # Определяем временные периоды
         today = datetime.now().date()
@@ -360,18 +282,21 @@ def main():
         week_ago = today - timedelta(days=7)
         month_ago = today - timedelta(days=30)
 
-        # Создаем фильтры для разных периодов
-        today_data = scoring_df[scoring_df['Дата'].dt.date == today]
-        yesterday_data = scoring_df[scoring_df['Дата'].dt.date == yesterday]
-        week_data = scoring_df[scoring_df['Дата'].dt.date >= week_ago]
-        month_data = scoring_df[scoring_df['Дата'].dt.date >= month_ago]
+        # Все панели считаются по кубу агрегатов, а не по строкам скоринга
+        cube = get_scoring_cube()
+        if cube.version != snapshot.version:
+            # Дописываем новые строки, только если куб построен по версии, которую они продолжают;
+            # иначе (пропущена промежуточная версия) куб перестраивается целиком
+            appended_from = snapshot.scoring_appended_from if cube.version == snapshot.base_version else None
+            cube.refresh(scoring_df, appended_from, snapshot.version)
+        sections.mark('cube', rows=len(scoring_df), cube_rows=len(cube.counts))
 
         # Получаем метрики
         metrics_data = {
-            "Сегодня": get_status_metrics(today_data),
-            "Вчера": get_status_metrics(yesterday_data),
-            "За неделю": get_status_metrics(week_data),
-            "За месяц": get_status_metrics(month_data)
+            "Сегодня": cube.totals(today, today),
+            "Вчера": cube.totals(yesterday, yesterday),
+            "За неделю": cube.totals(week_ago),
+            "За месяц": cube.totals(month_ago)
         }
 
         # Отображаем метрики в 4 колонках
@@ -388,6 +313,8 @@ def main():
                     </div>
                 """, unsafe_allow_html=True)
 
+        sections.mark('metrics')
+
         # Графики
         st.markdown("<hr>", unsafe_allow_html=True)
 
@@ -401,20 +328,30 @@ def main():
                 key="period_selector"
             )
 
-        selected_data = month_data if period == "За месяц" else week_data
+        selected_start = month_ago if period == "За месяц" else week_ago
         period_suffix = "за месяц" if period == "За месяц" else "за неделю"
 
         col_left, col_right = st.columns(2)
 
+        # Графики строятся заново только при изменении агрегата или параметров
         with col_left:
-            st.plotly_chart(create_status_pie_chart(selected_data), use_container_width=True)
-            st.plotly_chart(create_bar_chart(selected_data, 'Менеджер',
-                                           f"Статистика по менеджерам {period_suffix}"), use_container_width=True)
+            st.plotly_chart(figure_cache.figure(create_status_pie_chart, cube.status_counts(selected_start)),
+                            use_container_width=True)
+            st.plotly_chart(figure_cache.figure(create_bar_chart, cube.crosstab('Менеджер', selected_start),
+                                                title=f"Статистика по менеджерам {period_suffix}"),
+                            use_container_width=True)
 
         with col_right:
-            st.plotly_chart(create_bar_chart(selected_data, 'Филиал',
-                                           f"Статистика по филиалам {period_suffix}"), use_container_width=True)
-            st.plotly_chart(create_time_series(selected_data), use_container_width=True)
+            st.plotly_chart(figure_cache.figure(create_bar_chart, cube.crosstab('Филиал', selected_start),
+                                                title=f"Статистика по филиалам {period_suffix}"),
+                            use_container_width=True)
+            st.plotly_chart(figure_cache.figure(create_time_series, cube.daily(selected_start)),
+                            use_container_width=True)
+
+        sections.mark('charts')
+
+        today_metrics = cube.metrics('Филиал', today, today)
+        yesterday_metrics = cube.metrics('Филиал', yesterday, yesterday)
 
         # Добавляем детальную статистику по филиалам за сегодня и вчера
         st.markdown("<hr>", unsafe_allow_html=True)
@@ -424,82 +361,49 @@ def main():
             st.subheader("Статистика по филиалам за сегодня")
             if scoring_df is not None and excel_df is not None:
                 display_comparison_stats(
-                    today_data,
-                    excel_df[excel_df['Дата'].dt.date == today],
+                    today_metrics,
+                    period_slice(excel_df, today, today),
                     "за сегодня"
                 )
-            display_branch_cards(today_data, "Статистика скоринга за сегодня")
+            display_branch_cards(today_metrics, "Статистика скоринга за сегодня")
 
         with col2:
             st.subheader("Статистика по филиалам за вчера")
             if scoring_df is not None and excel_df is not None:
                 display_comparison_stats(
-                    yesterday_data,
-                    excel_df[excel_df['Дата'].dt.date == yesterday],
+                    yesterday_metrics,
+                    period_slice(excel_df, yesterday, yesterday),
                     "за вчера"
                 )
-            display_branch_cards(yesterday_data, "Статистика скоринга за вчера")
+            display_branch_cards(yesterday_metrics, "Статистика скоринга за вчера")
+
+        sections.mark('branches', rows=len(excel_df))
 
         # Добавляем сравнительный анализ
         st.markdown("<hr>", unsafe_allow_html=True)
         st.subheader("Сравнение с предыдущим днем")
 
-        for branch in set(today_data['Филиал'].unique()) | set(yesterday_data['Филиал'].unique()):
-            today_metrics = get_status_metrics(today_data[today_data['Филиал'] == branch])
-            yesterday_metrics = get_status_metrics(yesterday_data[yesterday_data['Филиал'] == branch])
-
-            change = today_metrics['total'] - yesterday_metrics['total']
-            change_color = 'green' if change > 0 else 'red' if change < 0 else '#666'
-            change_symbol = '↑' if change > 0 else '↓' if change < 0 else '='
-
-            st.markdown(f"""
-                <div class="branch-card">
-                    <div class="branch-name">{branch}</div>
-                    <div class="stats-container">
-                        <div class="stat-item">
-                            <div class="stat-value total">{today_metrics['total']}</div>
-                            <div class="stat-label">СЕГОДНЯ (ВСЕГО)</div>
-                        </div>
-                        <div class="stat-item">
-                            <div class="stat-value total">{yesterday_metrics['total']}</div>
-                            <div class="stat-label">ВЧЕРА (ВСЕГО)</div>
-                        </div>
-                        <div class="stat-item">
-                            <div class="stat-value" style="color: {change_color}">{change_symbol} {abs(change)}</div>
-                            <div class="stat-label">ИЗМЕНЕНИЕ</div>
-                        </div>
-                        <div class="stat-item">
-                            <div class="stat-value approval-rate">{today_metrics['approval_rate']:.1f}%</div>
-                            <div class="stat-label">СЕГОДНЯ (% ОДОБРЕНИЯ)</div>
-                        </div>
-                        <div class="stat-item">
-                            <div class="stat-value approval-rate">{yesterday_metrics['approval_rate']:.1f}%</div>
-                            <div class="stat-label">ВЧЕРА (% ОДОБРЕНИЯ)</div>
-                        </div>
-                    </div>
-                </div>
-            """, unsafe_allow_html=True)
-         # Детальная статистика по филиалам
+        day_comparison = compare_days(today_metrics, yesterday_metrics)
+        st.markdown(day_comparison_cards_html(day_comparison), unsafe_allow_html=True)
+
+        sections.mark('day_comparison')
+
+        # Сравнение источников за выбранный период по истории 1С
         st.markdown("<hr>", unsafe_allow_html=True)
-        st.subheader(f"Детальная статистика по филиалам {period_suffix}")
+        st.subheader(f"Заявки через скоринг и 1С {period_suffix}")
+        display_comparison_stats(
+            cube.metrics('Филиал', selected_start),
+            period_slice(excel_df, selected_start),
+            period_suffix
+        )
 
-        branch_stats = pd.DataFrame()
-        for branch in selected_data['Филиал'].unique():
-            branch_data = selected_data[selected_data['Филиал'] == branch]
-            metrics = get_status_metrics(branch_data)
-            branch_stats = pd.concat([branch_stats, pd.DataFrame({
-                'Филиал': [branch],
-                'Всего заявок': [metrics['total']],
-                'Одобрено': [metrics['approved']],
-                'Отказано': [metrics['rejected']],
-                'Процент одобрения': [f"{metrics['approval_rate']:.1f}%"]
-            })])
+        sections.mark('period_comparison')
 
-        # Сбрасываем индекс и убеждаемся в уникальности
-        branch_stats = branch_stats.reset_index(drop=True)
+        # Детальная статистика по филиалам
+        st.markdown("<hr>", unsafe_allow_html=True)
+        st.subheader(f"Детальная статистика по филиалам {period_suffix}")
 
-        # Проверяем на дубликаты и удаляем их если есть
-        branch_stats = branch_stats.drop_duplicates()
+        branch_stats = branch_stats_table(cube.metrics('Филиал', selected_start))
 
         def highlight_stats(val):
             if isinstance(val, str) and '%' in val:
@@ -524,10 +428,21 @@ def main():
             use_container_width=True,
             height=400
         )
+        sections.mark('branch_table')
+
+        # Долгосрочная динамика строится по дневным итогам, а не по строкам
+        weekly = weekly_trend(snapshot.daily_totals)
+        if len(weekly):
+            st.markdown("<hr>", unsafe_allow_html=True)
+            st.subheader("Долгосрочная динамика")
+            st.plotly_chart(figure_cache.figure(create_trend_chart, weekly), use_container_width=True)
+        sections.mark('trend')
 
     except Exception as e:
         st.error(f"Произошла ошибка при загрузке данных: {str(e)}")
         st.error("Пожалуйста, проверьте подключение к Google Sheets и формат данных.")
 
 if __name__ == "__main__":
-    main()
+    with span('render.page'):
+        main()
+    display_perf_panel()
@@ -0,0 +1,100 @@
+import threading
+import time
+from logger_config import setup_logger
+
+logger = setup_logger('data_cache')
+
+
+class _Flight:
+    """Загрузка, выполняющаяся в данный момент для одного ключа"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class DataCache:
+    """Общий для процесса кэш с TTL и однократной загрузкой (single-flight).
+
+    Модуль импортируется один раз на процесс Streamlit, поэтому экземпляр
+    разделяется всеми сессиями. Если несколько сессий одновременно запрашивают
+    отсутствующий ключ, загрузку выполняет только первая, остальные ждут её
+    результата.
+    """
+
+    def __init__(self, ttl=300):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._in_flight = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def _is_fresh(self, entry, ttl):
+        return time.monotonic() - entry[1] < ttl
+
+    def get_or_load(self, key, loader, ttl=None):
+        """Возвращает значение из кэша или загружает его через loader"""
+        ttl = self.ttl if ttl is None else ttl
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._is_fresh(entry, ttl):
+                self.hits += 1
+                return entry[0]
+
+            flight = self._in_flight.get(key)
+            is_leader = flight is None
+            if is_leader:
+                flight = _Flight()
+                self._in_flight[key] = flight
+                self.misses += 1
+            else:
+                self.coalesced += 1
+
+        if not is_leader:
+            logger.info(f"Ожидание загрузки, уже выполняемой другой сессией: {key}")
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        logger.info(f"Промах кэша, загружаем данные: {key}")
+        try:
+            flight.value = loader()
+            return flight.value
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                if flight.error is None:
+                    self._entries[key] = (flight.value, time.monotonic())
+                self._in_flight.pop(key, None)
+            flight.event.set()
+
+    def invalidate(self, key=None):
+        """Сбрасывает один ключ или весь кэш"""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+        logger.info(f"Кэш сброшен: {key if key is not None else 'все ключи'}")
+
+    def stats(self):
+        """Счетчики попаданий и промахов"""
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'coalesced': self.coalesced,
+                'keys': len(self._entries),
+            }
+
+
+# Общий кэш процесса; значения дашборда живут весь процесс (ttl=inf), свежесть
+# данных обеспечивает опрос снимков
+data_cache = DataCache()
@@ -0,0 +1,132 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+import pandas as pd
+from dotenv import load_dotenv
+from sheets_client import sheets_client
+from ftp_excel_reader import FTPExcelReader
+from cache_manager import CacheManager
+from scoring_store import ScoringStore
+from history_store import DailyPartitionStore
+from logger_config import setup_logger
+from perf import span
+
+load_dotenv()
+
+logger = setup_logger('data_loader')
+
+# Предельное время ожидания каждого источника в секундах
+SCORING_TIMEOUT = float(os.getenv("SCORING_TIMEOUT", "120"))
+FTP_TIMEOUT = float(os.getenv("FTP_TIMEOUT", "300"))
+
+# Пул живет на уровне модуля: зависшая загрузка не блокирует возврат результата
+_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="data-source")
+
+
+class CombinedData:
+    """Результат загрузки обоих источников.
+
+    Если один из источников завершился ошибкой или не уложился во время,
+    его DataFrame равен None, а причина записана в errors.
+    """
+
+    def __init__(self, scoring_df, excel_df, errors):
+        self.scoring_df = scoring_df
+        self.excel_df = excel_df
+        self.errors = errors
+
+    @property
+    def partial(self):
+        return bool(self.errors)
+
+
+def get_scoring_data(store=None):
+    """Получение данных из Google Sheets"""
+    try:
+        with span('scoring.fetch') as s:
+            # Клиент, ключ таблицы и лист переиспользуются между обновлениями
+            worksheet = sheets_client.worksheet()
+
+            # Загружаем только новые строки, даты разбираются только для них
+            store = store or ScoringStore()
+            df = store.sync(worksheet)
+            s.set(rows=len(df))
+
+        # Проверяем успешность преобразования
+        if not pd.api.types.is_datetime64_any_dtype(df['Дата']):
+            raise ValueError("Failed to convert date column to datetime")
+
+        return df
+    except Exception as e:
+        logger.error(f"Ошибка при загрузке данных скоринга: {str(e)}")
+        sheets_client.reset()
+        raise
+
+
+def get_1c_data(history=None):
+    """Получение данных 1С из кэша или с FTP.
+
+    Свежая выгрузка дописывается в историю по дням; возвращаются все дни
+    истории в пределах срока хранения.
+    """
+    with span('1c.load') as s:
+        cache_manager = CacheManager()
+        history = history or DailyPartitionStore()
+
+        def fetch():
+            logger.info("Данные 1С не найдены в кэше, загружаем с FTP")
+            # Если нет в кэше, загружаем с FTP
+            ftp_reader = FTPExcelReader()
+            excel_df = ftp_reader.read_excel()
+            history.write(excel_df)
+            return excel_df
+
+        # Одновременный промах нескольких процессов дает одну загрузку с FTP
+        excel_df, cache_hit = cache_manager.get_or_fetch(fetch, timeout=FTP_TIMEOUT)
+        if cache_hit:
+            logger.info("Загружаем данные 1С из кэша")
+            # Снимок хранит даты в нативном формате, повторный разбор не нужен
+            if not history.days():
+                history.write(excel_df)
+
+        excel_df = history.read(history.retention_start())
+        s.set(cache='hit' if cache_hit else 'miss', rows=len(excel_df))
+    return excel_df
+
+
+def get_combined_data(store=None, scoring_timeout=SCORING_TIMEOUT, ftp_timeout=FTP_TIMEOUT):
+    """Параллельное получение данных из скоринга и 1С.
+
+    Google Sheets и FTP загружаются одновременно, у каждого источника свой
+    предельный срок. Ошибка или таймаут одного источника не мешают вернуть
+    данные другого; в этом случае результат помечается как частичный.
+    """
+    logger.info("Начало получения комбинированных данных")
+
+    with span('get_combined_data') as s:
+        started = time.monotonic()
+        futures = {
+            'scoring': (_executor.submit(get_scoring_data, store), scoring_timeout),
+            '1c': (_executor.submit(get_1c_data), ftp_timeout),
+        }
+
+        results = {}
+        errors = {}
+        for source, (future, timeout) in futures.items():
+            remaining = max(0.0, timeout - (time.monotonic() - started))
+            try:
+                results[source] = future.result(timeout=remaining)
+            except FutureTimeoutError:
+                logger.error(f"Источник {source} не ответил за {timeout:g} с")
+                errors[source] = f"таймаут {timeout:g} с"
+            except Exception as e:
+                logger.error(f"Ошибка загрузки источника {source}: {str(e)}")
+                errors[source] = str(e)
+
+        data = CombinedData(results.get('scoring'), results.get('1c'), errors)
+        s.set(partial=data.partial, failed=sorted(errors))
+    logger.info(f"Получено записей из скоринга: {len(data.scoring_df) if data.scoring_df is not None else 0}")
+    logger.info(f"Получено записей из 1С: {len(data.excel_df) if data.excel_df is not None else 0}")
+    logger.info(f"Загрузка заняла {time.monotonic() - started:.1f} с, частичные данные: {data.partial}")
+
+    return data
@@ -0,0 +1,60 @@
+import pandas as pd
+from logger_config import setup_logger
+
+logger = setup_logger('date_parser')
+
+# Форматы дат, встречающиеся в выгрузке 1С и в Google таблице:
+# регулярное выражение для классификации и формат для разбора всей группы
+DATE_FORMATS = [
+    # 2024-06-19 11:25:42 (Google таблица)
+    (r'^\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}$', '%Y-%m-%d %H:%M:%S'),
+    # 12/8/2024 9:42:48 AM (Excel, 12-часовой формат; без пробела перед AM - автоматически)
+    (r'^\d{1,2}/\d{1,2}/\d{4} \d{1,2}:\d{2}:\d{2} [AaPp][Mm]$', '%m/%d/%Y %I:%M:%S %p'),
+    # 08.12.2024 09:37:03
+    (r'^\d{1,2}\.\d{1,2}\.\d{4} \d{1,2}:\d{2}:\d{2}$', '%d.%m.%Y %H:%M:%S'),
+    # 12/8/2024 09:37:03
+    (r'^\d{1,2}/\d{1,2}/\d{4} \d{1,2}:\d{2}:\d{2}$', '%m/%d/%Y %H:%M:%S'),
+]
+
+# Сколько примеров неразобранных значений выводить в лог
+MAX_LOGGED_EXAMPLES = 5
+
+
+def parse_dates(values, source="данных"):
+    """Векторно преобразует колонку дат смешанных форматов в datetime.
+
+    Значения классифицируются по формату строковыми проверками, затем каждая
+    группа разбирается одним вызовом to_datetime с явным форматом. Значения,
+    не разобранные своим форматом, передаются автоматическому определению;
+    оставшиеся становятся NaT и выводятся в лог одной записью.
+    """
+    if not isinstance(values, pd.Series):
+        values = pd.Series(values)
+
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values
+
+    text = values.astype(str).str.strip()
+    present = values.notna() & (text != '')
+    result = pd.Series(pd.NaT, index=values.index, dtype='datetime64[ns]')
+
+    remaining = present.copy()
+    for pattern, date_format in DATE_FORMATS:
+        matched = remaining & text.str.match(pattern)
+        if matched.any():
+            result[matched] = pd.to_datetime(text[matched], format=date_format, errors='coerce').to_numpy()
+            # Значения, не подошедшие к формату группы, остаются для автоматического определения
+            remaining &= ~matched | result.isna()
+
+    # Прочие форматы разбираем автоматическим определением
+    if remaining.any():
+        logger.debug(f"Значений {source} без известного формата: {int(remaining.sum())}")
+        result[remaining] = pd.to_datetime(text[remaining], errors='coerce').to_numpy()
+
+    unparsed = present & result.isna()
+    unparsed_count = int(unparsed.sum())
+    if unparsed_count:
+        examples = values[unparsed].head(MAX_LOGGED_EXAMPLES).tolist()
+        logger.warning(f"Не удалось преобразовать {unparsed_count} дат {source}, примеры: {examples}")
+
+    return result
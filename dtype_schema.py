@@ -0,0 +1,60 @@
+import pandas as pd
+from logger_config import setup_logger
+
+logger = setup_logger('dtype_schema')
+
+# Колонки с небольшим числом различных значений храним как категории;
+# коды категорий занимают 1-2 байта на строку вместо объекта Python.
+# Клиент почти уникален для каждой строки, поэтому остается строковым
+CATEGORY_COLUMNS = ['Филиал', 'Менеджер', 'Результат']
+DATETIME_COLUMNS = ['Дата']
+
+
+def memory_usage(df):
+    """Занимаемая память по колонкам в байтах (с учетом строк Python)"""
+    return df.memory_usage(deep=True, index=False)
+
+
+def memory_report(before, after):
+    """Сравнение памяти по колонкам до и после применения схемы"""
+    report = pd.DataFrame({
+        'dtype_before': pd.Series({column: str(dtype) for column, dtype in before.dtypes.items()}),
+        'bytes_before': memory_usage(before),
+        'dtype_after': pd.Series({column: str(dtype) for column, dtype in after.dtypes.items()}),
+        'bytes_after': memory_usage(after),
+    })
+    report.loc['Итого'] = ['', report['bytes_before'].sum(), '', report['bytes_after'].sum()]
+    report = report.astype({'bytes_before': 'int64', 'bytes_after': 'int64'})
+    report['ratio'] = (report['bytes_after'] / report['bytes_before']).round(3)
+    return report
+
+
+def _compact_column(series, column):
+    if column in DATETIME_COLUMNS:
+        return series if pd.api.types.is_datetime64_any_dtype(series) else pd.to_datetime(series, errors='coerce')
+    if column in CATEGORY_COLUMNS:
+        return series if isinstance(series.dtype, pd.CategoricalDtype) else series.astype('category')
+    if pd.api.types.is_bool_dtype(series):
+        return series
+    if pd.api.types.is_integer_dtype(series):
+        return pd.to_numeric(series, downcast='integer')
+    if pd.api.types.is_float_dtype(series):
+        return pd.to_numeric(series, downcast='float')
+    return series
+
+
+def apply_schema(df, source="данных"):
+    """Приводит DataFrame к компактной схеме типов.
+
+    Категории для филиала, менеджера и результата (коды результата занимают
+    int8), datetime64 для даты, уменьшенная разрядность числовых колонок.
+    Остальные колонки, в том числе клиент, не меняются.
+    """
+    compact = df.copy(deep=False)
+    for column in compact.columns:
+        try:
+            compact[column] = _compact_column(compact[column], column)
+        except Exception as e:
+            # Колонка остается в исходном типе
+            logger.warning(f"Не удалось привести колонку {column} {source}: {str(e)}")
+    return compact
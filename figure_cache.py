@@ -0,0 +1,71 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+import pandas as pd
+from dotenv import load_dotenv
+from logger_config import setup_logger
+
+load_dotenv()
+
+logger = setup_logger('figure_cache')
+
+
+def fingerprint(data):
+    """Быстрый отпечаток агрегата (Series или DataFrame): значения, индекс и названия колонок"""
+    frame = data.to_frame() if isinstance(data, pd.Series) else data
+    digest = hashlib.sha1(pd.util.hash_pandas_object(frame, index=True).values.tobytes())
+    digest.update(repr((list(frame.columns), list(frame.index.names), frame.shape)).encode('utf-8'))
+    return digest.hexdigest()
+
+
+class FigureCache:
+    """Общий для процесса кэш графиков с вытеснением давно не используемых (LRU).
+
+    Ключ - построитель, отпечаток агрегата и параметры графика. Повторная
+    отрисовка без изменения данных и периода не строит график заново.
+    """
+
+    def __init__(self, max_entries=64):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def figure(self, builder, data, **params):
+        """График builder(data, **params) из кэша (объект plotly)"""
+        key = (builder.__name__, fingerprint(data), tuple(sorted(params.items())))
+
+        with self._lock:
+            figure = self._entries.get(key)
+            if figure is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return figure
+            self.misses += 1
+
+        figure = builder(data, **params)
+        with self._lock:
+            self._entries[key] = figure
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return figure
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        logger.info("Кэш графиков очищен")
+
+    def stats(self):
+        """Счетчики попаданий и промахов"""
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'keys': len(self._entries),
+            }
+
+
+figure_cache = FigureCache(max_entries=int(os.getenv("FIGURE_CACHE_SIZE", "64")))
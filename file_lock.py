@@ -0,0 +1,127 @@
+import json
+import os
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from logger_config import setup_logger
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+logger = setup_logger('file_lock')
+
+
+def _try_lock(f):
+    """Неблокирующая попытка взять эксклюзивную блокировку файла"""
+    try:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+        return True
+    except OSError:
+        return False
+
+
+def _unlock(f):
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+    else:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class FileLock:
+    """Межпроцессная блокировка на файле.
+
+    Пока блокировка взята, в файле лежит отметка о выполняемой загрузке
+    (процесс, хост, время начала). Остальные процессы ждут её снятия, а не
+    повторяют ту же загрузку. Блокировка снимается ОС и при аварийном
+    завершении процесса.
+    """
+
+    def __init__(self, path, timeout=600, poll_interval=0.2):
+        self.path = path
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self._file = None
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def holder(self):
+        """Отметка процесса, выполняющего загрузку (None, если её нет)"""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.loads(f.read() or 'null')
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def acquire(self):
+        f = open(self.path, 'a+', encoding='utf-8')
+        deadline = time.monotonic() + self.timeout
+        waiting = False
+        while not _try_lock(f):
+            if not waiting:
+                logger.info(f"Ожидание загрузки, выполняемой другим процессом: {self.holder()}")
+                waiting = True
+            if time.monotonic() >= deadline:
+                f.close()
+                raise TimeoutError(f"Блокировка {self.path} не освобождена за {self.timeout:g} с")
+            time.sleep(self.poll_interval)
+
+        f.seek(0)
+        f.truncate()
+        f.write(json.dumps({
+            'pid': os.getpid(),
+            'host': socket.gethostname(),
+            'started_at': datetime.now().isoformat(timespec='seconds'),
+        }))
+        f.flush()
+        self._file = f
+        return waiting
+
+    def release(self):
+        if self._file is None:
+            return
+        try:
+            self._file.seek(0)
+            self._file.truncate()
+            self._file.flush()
+            _unlock(self._file)
+        finally:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *args):
+        self.release()
+        return False
+
+
+@contextmanager
+def atomic_path(path):
+    """Путь временного файла, который после успешной записи заменяет path.
+
+    Читатели видят либо старый файл, либо новый целиком; при ошибке
+    временный файл удаляется.
+    """
+    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        yield temp_path
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.unlink(temp_path)
+        except FileNotFoundError:
+            pass
+        raise
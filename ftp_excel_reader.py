@@ -1,10 +1,15 @@
-from ftplib import FTP
+from ftplib import FTP, error_perm
+from datetime import datetime, timedelta
+import glob
+import json
 import pandas as pd
-from io import BytesIO
-import tempfile
 import os
-from datetime import datetime
-from logger_config import setup_logger
+from logger_config import setup_logger, SampledLog
+from perf import span
+from file_lock import FileLock, atomic_path
+from date_parser import parse_dates
+from branch_normalizer import branch_normalizer
+from dtype_schema import apply_schema
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -12,200 +17,275 @@ load_dotenv()
 logger = setup_logger('ftp_excel_reader')
 
 class FTPExcelReader:
-    def __init__(self):
+    # Колонки выгрузки 1С, которые использует дашборд, и их новые названия
+    COLUMN_MAPPING = {
+        "Дата": "Дата",
+        "Номер": "Номер",
+        "Организация": "Филиал",
+        "Партнер": "Клиент",
+    }
+
+    def __init__(self, store_dir="cache/ftp", conditional=True, date_window_days=None):
         self.host = os.getenv("FTP_HOST")
         self.username = os.getenv("FTP_USERNAME")
         self.password = os.getenv("FTP_PASSWORD")
         self.filename = os.getenv("FTP_FILENAME")
+        # Локальное хранилище скачанных файлов и их разобранных копий
+        self.store_dir = store_dir
+        # Пропускать скачивание, если размер и время изменения файла на сервере не изменились
+        self.conditional = conditional
+        # Сколько последних дней выгрузки читать (None - все строки)
+        if date_window_days is None and os.getenv("FTP_DATE_WINDOW_DAYS"):
+            date_window_days = int(os.getenv("FTP_DATE_WINDOW_DAYS"))
+        self.date_window_days = date_window_days
+        # Таймаут операций сокета: зависшая загрузка завершается ошибкой и освобождает блокировки
+        self.socket_timeout = float(os.getenv("FTP_SOCKET_TIMEOUT", "60"))
         logger.info("Инициализирован FTPExcelReader")
 
+    @staticmethod
+    def _meta_path(path):
+        return f"{path}.meta.json"
+
+    def _load_meta(self, path):
+        """Читает сохраненные размер и время изменения файла"""
+        try:
+            with open(self._meta_path(path), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def _save_meta(self, path, meta):
+        with atomic_path(self._meta_path(path)) as temp_path:
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(meta, f)
+
+    def _remove_meta(self, path):
+        try:
+            os.unlink(self._meta_path(path))
+        except FileNotFoundError:
+            pass
+
+    def _remote_meta(self, ftp, filename):
+        """Запрашивает размер (SIZE) и время изменения (MDTM) файла на сервере"""
+        ftp.voidcmd("TYPE I")
+        size = ftp.size(filename)
+        try:
+            mdtm = ftp.sendcmd(f"MDTM {filename}").split()[-1]
+        except error_perm as e:
+            logger.warning(f"Сервер не поддерживает MDTM: {str(e)}")
+            mdtm = None
+        return {'size': size, 'mdtm': mdtm}
+
+    def _resolve_remote_file(self, ftp):
+        """Определяет файл для скачивания и его метаданные"""
+        try:
+            return self.filename, self._remote_meta(ftp, self.filename)
+        except error_perm as e:
+            logger.warning(f"Основной файл недоступен: {str(e)}")
+
+        files = ftp.nlst()
+        logger.debug(f"Список файлов: {files}")
+        excel_files = [f for f in files if f.endswith(".xlsx")]
+        if not excel_files:
+            logger.error(f"Excel файлы не найдены. Доступные файлы: {files}")
+            raise Exception(f"Excel файлы не найдены. Доступные файлы: {files}")
+
+        logger.info(f"Найдены альтернативные Excel файлы: {excel_files}")
+        self.filename = excel_files[0]
+        return self.filename, self._remote_meta(ftp, self.filename)
+
     def download_excel(self):
-        """Скачивает Excel файл с FTP сервера"""
+        """Скачивает Excel файл с FTP сервера.
+
+        Возвращает путь к локальной копии и признак того, что файл изменился.
+        Файл пишется напрямую на диск; прерванная загрузка продолжается командой REST.
+        """
         logger.info("Начало загрузки файла с FTP")
         try:
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".xlsx") as temp_file:
-                with FTP(self.host) as ftp:
-                    logger.info(f"Подключение к FTP серверу: {self.host}")
-                    ftp.login(user=self.username, passwd=self.password)
-
-                    logger.debug(f"Текущая директория: {ftp.pwd()}")
-                    files = ftp.nlst()
-                    logger.debug(f"Список файлов: {files}")
-
-                    with BytesIO() as bio:
-                        try:
-                            logger.info(f"Попытка скачать файл: {self.filename}")
-                            ftp.retrbinary(f"RETR {self.filename}", bio.write)
-                            bio.seek(0)
-                            temp_file.write(bio.read())
-                            logger.info(f"Файл {self.filename} успешно скачан")
-                        except Exception as e:
-                            logger.warning(f"Ошибка при скачивании основного файла: {str(e)}")
-                            excel_files = [f for f in files if f.endswith(".xlsx")]
-
-                            if excel_files:
-                                logger.info(f"Найдены альтернативные Excel файлы: {excel_files}")
-                                self.filename = excel_files[0]
-                                ftp.retrbinary(f"RETR {self.filename}", bio.write)
-                                bio.seek(0)
-                                temp_file.write(bio.read())
-                                logger.info(f"Альтернативный файл {self.filename} успешно скачан")
-                            else:
-                                logger.error(f"Excel файлы не найдены. Доступные файлы: {files}")
-                                raise Exception(f"Excel файлы не найдены. Доступные файлы: {files}")
-
-                return temp_file.name
+            os.makedirs(self.store_dir, exist_ok=True)
+            with span('ftp.download') as s, FTP(self.host, timeout=self.socket_timeout) as ftp:
+                logger.info(f"Подключение к FTP серверу: {self.host}")
+                ftp.login(user=self.username, passwd=self.password)
+
+                filename, remote_meta = self._resolve_remote_file(ftp)
+                local_path = os.path.join(self.store_dir, os.path.basename(filename))
+                logger.info(f"Файл на сервере: {filename}, размер: {remote_meta['size']}, изменен: {remote_meta['mdtm']}")
+
+                if (self.conditional and remote_meta['mdtm'] is not None and os.path.exists(local_path)
+                        and self._load_meta(local_path) == remote_meta):
+                    logger.info(f"Файл {filename} не изменился, скачивание пропущено")
+                    s.set(cache='hit', bytes=0)
+                    return local_path, False
+
+                part_path = f"{local_path}.part"
+                offset = 0
+                if os.path.exists(part_path) and self._load_meta(part_path) == remote_meta:
+                    offset = os.path.getsize(part_path)
+                    if remote_meta['size'] is not None and offset >= remote_meta['size']:
+                        offset = 0
+                if offset:
+                    logger.info(f"Продолжаем прерванную загрузку с позиции {offset} байт")
+                else:
+                    self._save_meta(part_path, remote_meta)
+
+                logger.info(f"Попытка скачать файл: {filename}")
+                with open(part_path, 'ab' if offset else 'wb') as f:
+                    ftp.retrbinary(f"RETR {filename}", f.write, rest=offset or None)
+
+                downloaded = os.path.getsize(part_path)
+                if remote_meta['size'] is not None and downloaded != remote_meta['size']:
+                    raise Exception(f"Файл скачан не полностью: {downloaded} из {remote_meta['size']} байт")
+
+                os.replace(part_path, local_path)
+                self._remove_meta(part_path)
+                self._save_meta(local_path, remote_meta)
+                s.set(cache='miss', bytes=downloaded - offset, resumed_from=offset)
+                logger.info(f"Файл {filename} успешно скачан")
+
+            return local_path, True
 
         except Exception as e:
             logger.error(f"Ошибка при скачивании файла с FTP: {str(e)}")
             raise
 
-    def _convert_date(self, date_str):
-        """Конвертирует строку даты в нужный формат"""
-        if pd.isna(date_str):
+    def _date_cutoff(self):
+        if self.date_window_days is None:
             return None
+        return datetime.combine(datetime.now().date() - timedelta(days=self.date_window_days), datetime.min.time())
 
-        if isinstance(date_str, (pd.Timestamp, datetime)):
-            return date_str
+    def _read_columns(self, file_path, cutoff=None):
+        """Потоково читает первый лист, оставляя только нужные колонки.
 
-        logger.debug(f"Попытка конвертации даты: {date_str}")
-        try:
-            # Если это строка из Google таблицы (2024-06-19 11:25:42)
-            if isinstance(date_str, str) and len(date_str) == 19 and date_str[4] == '-':
-                try:
-                    return pd.to_datetime(date_str, format='%Y-%m-%d %H:%M:%S')
-                except:
-                    pass
+        Строки с датой раньше cutoff отбрасываются при чтении (для ячеек, которые
+        Excel хранит как дату; строковые даты фильтруются после разбора).
+        """
+        import openpyxl
 
-            # Если это строка из Excel (12/8/2024 9:42:48 AM)
-            if isinstance(date_str, str) and 'AM' in date_str.upper() or 'PM' in date_str.upper():
-                try:
-                    # Преобразуем 12-часовой формат в 24-часовой
-                    return pd.to_datetime(date_str, format='%m/%d/%Y %I:%M:%S %p')
-                except:
-                    pass
-
-            # Пробуем другие форматы
-            date_formats = [
-                '%d.%m.%Y %H:%M:%S',     # 08.12.2024 09:37:03
-                '%Y-%m-%d %H:%M:%S',     # 2024-12-08 09:37:03
-                '%m/%d/%Y %H:%M:%S',     # 12/8/2024 09:37:03
-            ]
-
-            for date_format in date_formats:
-                try:
-                    return datetime.strptime(date_str, date_format)
-                except ValueError:
+        workbook = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+        try:
+            rows = workbook.active.iter_rows(values_only=True)
+            header = next(rows, None) or ()
+            positions = {
+                self.COLUMN_MAPPING[name]: position
+                for position, name in enumerate(header)
+                if name in self.COLUMN_MAPPING
+            }
+            if "Дата" not in positions:
+                raise ValueError(f"В файле нет колонки 'Дата'. Колонки: {list(header)}")
+
+            names = list(positions)
+            indexes = [positions[name] for name in names]
+            date_index = positions["Дата"]
+            columns = [[] for _ in names]
+            # Построчные сообщения пишутся выборочно, итог - одной записью
+            log_outside_window = SampledLog(logger)
+            log_empty_row = SampledLog(logger)
+
+            for row_number, row in enumerate(rows, start=2):
+                if cutoff is not None and date_index < len(row):
+                    value = row[date_index]
+                    if isinstance(value, datetime) and value < cutoff:
+                        log_outside_window(f"Строка {row_number} вне окна дат: {value}")
+                        continue
+                values = [row[index] if index < len(row) else None for index in indexes]
+                # Пустые строки в конце листа не переносим
+                if all(value is None for value in values):
+                    log_empty_row(f"Пустая строка {row_number}")
                     continue
+                for column, value in zip(columns, values):
+                    column.append(value)
 
-            # Если ни один формат не подошел, пробуем автоматическое определение
-            try:
-                return pd.to_datetime(date_str)
-            except:
-                logger.error(f"Не удалось преобразовать дату: {date_str}")
-                raise ValueError(f"Неподдерживаемый формат даты: {date_str}")
-
-        except Exception as e:
-            logger.error(f"Ошибка при конвертации даты '{date_str}': {str(e)}")
-            raise
-
-    def _normalize_branch_name(self, branch_name):
-        """Нормализует названия филиалов"""
-        if not isinstance(branch_name, str):
-            return branch_name
-
-        # Словарь соответствия названий
-        branch_mapping = {
-            "нохияи Спитамен": "Спитамен",
-            "нохиаи Спитамен": "Спитамен",
-            "нохияи Ч. Расулов": "Джаббор Расулов",
-            "нохиаи Ч. Расулов": "Джаббор Расулов",
-            "Ч. Расулов": "Джаббор Расулов",
-            "шахри Панчакент": "Пенджикент",
-            "шаҳри Панчакент": "Пенджикент",
-            "Панчакент": "Пенджикент",
-            "шахри Худжанд": "Худжанд",
-            "шаҳри Худжанд": "Худжанд",
-        }
-
-        # Приводим к нижнему регистру для поиска
-        branch_name_lower = branch_name.lower()
-
-        # Ищем соответствие в маппинге
-        for key, value in branch_mapping.items():
-            if key.lower() in branch_name_lower:
-                logger.info(f"Нормализация филиала: {branch_name} -> {value}")
-                return value
-
-        logger.warning(f"Неизвестное название филиала: {branch_name}")
-        return branch_name
+            if log_outside_window.count:
+                logger.info(f"Пропущено строк вне окна дат: {log_outside_window.count}")
+            if log_empty_row.count:
+                logger.info(f"Пропущено пустых строк: {log_empty_row.count}")
+            return pd.DataFrame(dict(zip(names, columns)))
+        finally:
+            workbook.close()
 
     def read_excel(self):
         """Читает и обрабатывает Excel файл"""
+        with span('excel.read_excel') as s:
+            # Скачивание и разбор выполняет один процесс; остальные ждут и берут готовую копию
+            os.makedirs(self.store_dir, exist_ok=True)
+            with FileLock(os.path.join(self.store_dir, "download.lock")):
+                df = self._read_excel()
+            s.set(rows=len(df))
+        return df
+
+    def _read_excel(self):
         logger.info("Начало чтения Excel файла")
         try:
-            temp_file_path = self.download_excel()
-            logger.info(f"Временный файл создан: {temp_file_path}")
+            file_path, changed = self.download_excel()
+            window = f"{self.date_window_days}d" if self.date_window_days is not None else "all"
+            parsed_path = f"{file_path}.{window}.feather"
+            if changed:
+                # Разобранные копии прежней версии файла больше не актуальны
+                for stale_path in glob.glob(f"{glob.escape(file_path)}.*.feather"):
+                    os.unlink(stale_path)
+
+            # Файл не изменился - используем результат предыдущего разбора
+            if not changed and os.path.exists(parsed_path):
+                try:
+                    with span('excel.parsed_copy', cache='hit', bytes=os.path.getsize(parsed_path)) as s:
+                        df = pd.read_feather(parsed_path)
+                        s.set(rows=len(df))
+                    logger.info(f"Используем ранее разобранные данные: {len(df)} строк")
+                    return df
+                except Exception as e:
+                    logger.warning(f"Ошибка чтения разобранной копии, разбираем файл заново: {str(e)}")
 
-            if not os.path.exists(temp_file_path):
-                logger.error("Временный файл не создан")
-                raise Exception("Временный файл не создан")
+            if not os.path.exists(file_path):
+                logger.error("Локальный файл не создан")
+                raise Exception("Локальный файл не создан")
 
-            file_size = os.path.getsize(temp_file_path)
+            file_size = os.path.getsize(file_path)
             logger.info(f"Размер файла: {file_size} байт")
 
             if file_size == 0:
                 logger.error("Скачанный файл пуст")
                 raise Exception("Скачанный файл пуст")
 
-            df = pd.read_excel(temp_file_path)
+            # Читаем только нужные колонки, сразу переименовывая их
+            cutoff = self._date_cutoff()
+            with span('excel.parse', bytes=file_size) as s:
+                df = self._read_columns(file_path, cutoff)
+                s.set(rows=len(df))
             logger.info(f"Прочитано строк: {len(df)}")
             logger.debug(f"Колонки: {df.columns.tolist()}")
 
-            # Переименовываем колонки
-            column_mapping = {
-                "Дата": "Дата",
-                "Номер": "Номер",
-                "Организация": "Филиал",
-                "Партнер": "Клиент",
-            }
-
-            df = df.rename(columns=column_mapping)
-
-            # Конвертируем даты
+            # Конвертируем даты: форматы определяются векторно, каждая группа разбирается одним вызовом
             logger.info("Конвертация дат...")
-            try:
-                # Сначала пробуем прямое преобразование
-                df["Дата"] = pd.to_datetime(df["Дата"])
-            except Exception as e:
-                logger.warning(f"Не удалось напрямую преобразовать даты: {str(e)}")
-                try:
-                    # Если не получилось, пробуем через apply
-                    df["Дата"] = df["Дата"].apply(self._convert_date)
-                    logger.info("Даты успешно преобразованы через _convert_date")
-                except Exception as e:
-                    logger.error(f"Ошибка при преобразовании дат через _convert_date: {str(e)}")
-                    raise
+            with span('excel.dates', rows=len(df)):
+                df["Дата"] = parse_dates(df["Дата"], source="1С")
 
             # Проверяем успешность конвертации
             if not pd.api.types.is_datetime64_any_dtype(df["Дата"]):
                 logger.error("Не удалось преобразовать колонку 'Дата' в datetime")
                 raise ValueError("Не удалось преобразовать даты в правильный формат")
 
+            if cutoff is not None:
+                df = df[df["Дата"] >= cutoff].reset_index(drop=True)
+
             logger.info(f"Тип данных колонки 'Дата': {df['Дата'].dtype}")
             logger.debug(f"Пример даты после конвертации: {df['Дата'].iloc[0] if len(df) > 0 else 'нет данных'}")
 
             # Нормализуем названия филиалов
             logger.info("Нормализация названий филиалов...")
-            df["Филиал"] = df["Филиал"].apply(self._normalize_branch_name)
+            with span('excel.branches', rows=len(df)):
+                df["Филиал"] = branch_normalizer.normalize(df["Филиал"], source="1С")
+
+            # Компактные типы: категории, datetime64, уменьшенная разрядность чисел
+            df = apply_schema(df, source="1С")
 
             logger.info("Обработка данных завершена")
 
             try:
-                os.unlink(temp_file_path)
-                logger.info("Временный файл удален")
+                with atomic_path(parsed_path) as temp_path:
+                    df.to_feather(temp_path)
+                logger.info("Разобранные данные сохранены для повторного использования")
             except Exception as e:
-                logger.warning(f"Ошибка при удалении временного файла: {str(e)}")
+                logger.warning(f"Ошибка при сохранении разобранных данных: {str(e)}")
 
             return df
 
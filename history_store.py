@@ -0,0 +1,146 @@
+import glob
+import hashlib
+import os
+from datetime import datetime, timedelta
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+from dotenv import load_dotenv
+from cache_manager import to_arrow_table
+from dtype_schema import apply_schema
+from logger_config import setup_logger
+from perf import span
+from file_lock import atomic_path
+
+load_dotenv()
+
+logger = setup_logger('history_store')
+
+# Сколько дней истории 1С хранить локально
+HISTORY_RETENTION_DAYS = int(os.getenv("HISTORY_RETENTION_DAYS", "90"))
+
+# Ключ метаданных Arrow с контрольной суммой содержимого дня
+CONTENT_HASH_KEY = b'content_hash'
+
+
+class DailyPartitionStore:
+    """История строк, разбитая по дням: один файл на день (по умолчанию - выгрузки 1С).
+
+    При записи переписываются только дни, содержимое которых изменилось;
+    чтение за период открывает только файлы нужных дней. Дни старше срока
+    хранения удаляются (retention_days=None - хранятся всегда).
+    """
+
+    def __init__(self, root="cache/1c_history", retention_days=HISTORY_RETENTION_DAYS, column='Дата',
+                 name="истории 1С"):
+        self.root = root
+        self.retention_days = retention_days
+        self.column = column
+        # Название для логов и приведения схемы
+        self.name = name
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, day):
+        return os.path.join(self.root, f"{day:%Y-%m-%d}.feather")
+
+    def days(self):
+        """Дни, для которых есть файлы, по возрастанию"""
+        days = []
+        for path in glob.glob(os.path.join(glob.escape(self.root), "*.feather")):
+            try:
+                days.append(datetime.strptime(os.path.basename(path)[:-len(".feather")], '%Y-%m-%d').date())
+            except ValueError:
+                continue
+        return sorted(days)
+
+    def retention_start(self):
+        """Первый день, входящий в срок хранения (None - без ограничения)"""
+        if self.retention_days is None:
+            return None
+        return datetime.now().date() - timedelta(days=self.retention_days)
+
+    @staticmethod
+    def _content_hash(df):
+        return hashlib.sha1(pd.util.hash_pandas_object(df, index=False).values.tobytes()).hexdigest()
+
+    def _stored_hash(self, path):
+        """Контрольная сумма из метаданных файла (без чтения данных)"""
+        try:
+            with pa.memory_map(path) as source:
+                metadata = pa.ipc.open_file(source).schema.metadata or {}
+            return metadata.get(CONTENT_HASH_KEY, b'').decode('utf-8') or None
+        except (FileNotFoundError, pa.ArrowInvalid):
+            return None
+
+    def _write_day(self, day, day_df):
+        """Записывает файл дня, если его содержимое изменилось"""
+        day_df = day_df.reset_index(drop=True)
+        content_hash = self._content_hash(day_df)
+        path = self._path(day)
+        if self._stored_hash(path) == content_hash:
+            return False
+
+        table = to_arrow_table(day_df, {CONTENT_HASH_KEY: content_hash.encode('utf-8')})
+        with atomic_path(path) as temp_path:
+            feather.write_feather(table, temp_path)
+        return True
+
+    def _dated(self, df):
+        """Строки с датой в пределах срока хранения, упорядоченные по дате"""
+        dated = df[df[self.column].notna()]
+        if len(dated) < len(df):
+            logger.warning(f"Строк без даты не записано в {self.name}: {len(df) - len(dated)}")
+        start = self.retention_start()
+        if start is not None:
+            dated = dated[dated[self.column] >= pd.Timestamp(start)]
+        return dated.sort_values(self.column, kind='stable')
+
+    def write(self, df, append_before=None):
+        """Записывает изменившиеся дни; возвращает число переписанных файлов.
+
+        Строки каждого дня заменяют содержимое его файла. Дни раньше append_before
+        дописываются к уже сохраненным строкам дня (строки, добавленные задним числом).
+        """
+        with span('history.write', rows=len(df)) as s:
+            dated = self._dated(df)
+            written = 0
+            for day, day_df in dated.groupby(dated[self.column].dt.normalize(), sort=False):
+                if append_before is not None and day < pd.Timestamp(append_before) and os.path.exists(self._path(day)):
+                    stored = feather.read_table(self._path(day)).to_pandas()
+                    day_df = pd.concat([stored, day_df], ignore_index=True)
+                written += self._write_day(day, day_df)
+
+            evicted = self.evict()
+            s.set(partitions=written, evicted=evicted)
+        logger.info(f"Запись {self.name}: переписано дней {written}, удалено устаревших {evicted}")
+        return written
+
+    def evict(self):
+        """Удаляет дни старше срока хранения"""
+        start = self.retention_start()
+        if start is None:
+            return 0
+        evicted = 0
+        for day in self.days():
+            if day >= start:
+                break
+            try:
+                os.unlink(self._path(day))
+                evicted += 1
+            except FileNotFoundError:
+                pass
+        return evicted
+
+    def read(self, start=None, end=None):
+        """Строки за период [start, end] (включительно), читаются только файлы этих дней"""
+        with span('history.read') as s:
+            days = [day for day in self.days()
+                    if (start is None or day >= start) and (end is None or day <= end)]
+            frames = [feather.read_table(self._path(day), memory_map=True).to_pandas() for day in days]
+            if frames:
+                # Категории разных дней различаются, поэтому схема применяется после объединения
+                df = apply_schema(pd.concat(frames, ignore_index=True), source=self.name)
+            else:
+                df = pd.DataFrame({self.column: pd.Series(dtype='datetime64[ns]'), 'Филиал': pd.Series(dtype=object)})
+            s.set(partitions=len(days), rows=len(df))
+        return df
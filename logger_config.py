@@ -1,38 +1,137 @@
+import atexit
+import glob
 import logging
 import os
-from datetime import datetime
+import queue
+import sys
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener, TimedRotatingFileHandler
+
+# Директория логов и число хранимых дневных файлов
+log_dir = os.getenv('LOG_DIR', 'logs')
+LOG_BACKUP_DAYS = int(os.getenv('LOG_BACKUP_DAYS', '30'))
+# Роль процесса в имени файла лога (по умолчанию - имя запущенного скрипта)
+LOG_ROLE = os.getenv('LOG_ROLE')
+
+_lock = threading.RLock()
+_queue_handler = None
+_listener = None
+
+
+class _LazyQueueHandler(QueueHandler):
+    """Очередь логов; файл, каталог и поток записи создаются при первом сообщении.
+
+    Импорт модулей, вызывающих setup_logger, не трогает файловую систему.
+    """
+
+    def enqueue(self, record):
+        if _listener is None:
+            _start_listener(self.queue)
+        super().enqueue(record)
+
+
+def _process_role():
+    """Имя запущенного скрипта: dashboard, refresher, report, bench..."""
+    path = os.path.abspath(sys.argv[0]) if sys.argv and sys.argv[0] not in ('', '-c') else ''
+    name = os.path.splitext(os.path.basename(path))[0]
+    if name == '__main__':
+        name = os.path.basename(os.path.dirname(path))
+    return name or 'python'
+
+
+def log_file_path():
+    """Файл лога текущего процесса.
+
+    У каждого процесса (воркеры Streamlit, refresher.py, отчеты, бенчмарк) свой
+    файл: полуночная ротация одного общего файла несколькими процессами удаляет
+    и переименовывает файлы, в которые пишут другие процессы.
+    """
+    role = LOG_ROLE or _process_role()
+    return os.path.join(log_dir, f"km_dashboard.{role}.{os.getpid()}.log")
+
+
+def _remove_stale_logs():
+    """Удаляет файлы завершившихся процессов старше LOG_BACKUP_DAYS дней"""
+    deadline = time.time() - LOG_BACKUP_DAYS * 24 * 3600
+    for path in glob.glob(os.path.join(glob.escape(log_dir), "km_dashboard.*.log*")):
+        try:
+            if os.path.getmtime(path) < deadline:
+                os.unlink(path)
+        except OSError:
+            pass
+
+
+def _start_listener(log_queue):
+    """Создает обработчики один раз на процесс; запись в файл и консоль идет в отдельном потоке"""
+    global _listener
+
+    with _lock:
+        if _listener is not None:
+            return
+        os.makedirs(log_dir, exist_ok=True)
+        _remove_stale_logs()
+
+        # Формат логов
+        formatter = logging.Formatter(
+            '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+        )
+
+        # Хендлер для файла процесса: новый файл каждую полночь
+        file_handler = TimedRotatingFileHandler(
+            log_file_path(),
+            when='midnight',
+            backupCount=LOG_BACKUP_DAYS,
+            encoding='utf-8'
+        )
+        file_handler.setLevel(logging.DEBUG)
+        file_handler.setFormatter(formatter)
+
+        # Хендлер для консоли
+        console_handler = logging.StreamHandler()
+        console_handler.setLevel(logging.INFO)
+        console_handler.setFormatter(formatter)
+
+        _listener = QueueListener(log_queue, file_handler, console_handler, respect_handler_level=True)
+        _listener.start()
+        atexit.register(_listener.stop)
 
-# Создаем директорию для логов, если её нет
-log_dir = 'logs'
-if not os.path.exists(log_dir):
-    os.makedirs(log_dir)
 
 # Конфигурация логгера
 def setup_logger(name):
+    """Возвращает логгер; повторные вызовы не добавляют обработчиков"""
+    global _queue_handler
     logger = logging.getLogger(name)
-    logger.setLevel(logging.DEBUG)
-
-    # Формат логов
-    formatter = logging.Formatter(
-        '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-    )
-
-    # Хендлер для файла
-    current_date = datetime.now().strftime('%Y-%m-%d')
-    file_handler = logging.FileHandler(
-        f'{log_dir}/{current_date}_{name}.log',
-        encoding='utf-8'
-    )
-    file_handler.setLevel(logging.DEBUG)
-    file_handler.setFormatter(formatter)
-
-    # Хендлер для консоли
-    console_handler = logging.StreamHandler()
-    console_handler.setLevel(logging.INFO)
-    console_handler.setFormatter(formatter)
-
-    # Добавляем хендлеры к логгеру
-    logger.addHandler(file_handler)
-    logger.addHandler(console_handler)
-
-    return logger
\ No newline at end of file
+
+    with _lock:
+        if _queue_handler is None:
+            _queue_handler = _LazyQueueHandler(queue.SimpleQueue())
+            _queue_handler.km_queue_handler = True
+
+        # Обработчик уже добавлен (в том числе до перезагрузки модуля Streamlit)
+        if any(getattr(handler, 'km_queue_handler', False) for handler in logger.handlers):
+            return logger
+
+        logger.setLevel(logging.DEBUG)
+        logger.addHandler(_queue_handler)
+        logger.propagate = False
+
+    return logger
+
+
+class SampledLog:
+    """Выборочное логирование для сообщений, которые пишутся на каждую строку.
+
+    В лог попадает первое сообщение и затем каждое every-е с общим счетчиком.
+    """
+
+    def __init__(self, logger, every=1000, level=logging.DEBUG):
+        self.logger = logger
+        self.every = every
+        self.level = level
+        self.count = 0
+
+    def __call__(self, message):
+        self.count += 1
+        if self.count == 1 or self.count % self.every == 0:
+            self.logger.log(self.level, f"{message} (всего таких сообщений: {self.count})")
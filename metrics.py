@@ -0,0 +1,191 @@
+import threading
+import pandas as pd
+
+APPROVED = "Одобрено"
+REJECTED = "Отказано"
+
+METRIC_COLUMNS = ['total', 'approved', 'rejected', 'approval_rate']
+
+# Измерения куба агрегатов
+CUBE_DIMENSIONS = ['day', 'Филиал', 'Менеджер', 'Результат']
+
+
+def _empty_metrics():
+    return pd.DataFrame(0, index=pd.Index([]), columns=METRIC_COLUMNS)
+
+
+def _empty_counts():
+    """Пустой куб с типизированными колонками (day - даты, count - целые)"""
+    return pd.DataFrame({
+        'day': pd.Series(dtype='datetime64[ns]'),
+        **{column: pd.Series(dtype=object) for column in CUBE_DIMENSIONS[1:]},
+        'count': pd.Series(dtype='int64'),
+    })
+
+
+def _metrics_from_counts(counts):
+    """Метрики из таблицы количеств (строки - группы, колонки - результаты)"""
+    result = pd.DataFrame(index=counts.index)
+    result['total'] = counts.sum(axis=1)
+    result['approved'] = counts[APPROVED] if APPROVED in counts.columns else 0
+    result['rejected'] = counts[REJECTED] if REJECTED in counts.columns else 0
+    result['approval_rate'] = (result['approved'] / result['total'] * 100).where(result['total'] > 0, 0.0)
+    return result
+
+
+def compute_metrics(data, keys):
+    """Расчет метрик по статусам для любых ключей группировки за один проход.
+
+    keys - имя колонки, Series (например, data['Дата'].dt.date) или список из них.
+    Возвращает DataFrame с колонками total, approved, rejected, approval_rate.
+    """
+    if not isinstance(keys, list):
+        keys = [keys]
+
+    if len(data) == 0:
+        return _empty_metrics()
+
+    counts = data.groupby(keys + ['Результат'], dropna=False, observed=True).size().unstack(fill_value=0)
+    return _metrics_from_counts(counts)
+
+
+def get_status_metrics(data):
+    """Расчет метрик по статусам"""
+    total = len(data)
+    results = data['Результат'].value_counts() if total > 0 else pd.Series(dtype='int64')
+    return _status_metrics_from_counts(results)
+
+
+def _status_metrics_from_counts(results):
+    total = int(results.sum())
+    approved = int(results.get(APPROVED, 0))
+    rejected = int(results.get(REJECTED, 0))
+    approval_rate = (approved / total * 100) if total > 0 else 0
+
+    return {
+        'total': total,
+        'approved': approved,
+        'rejected': rejected,
+        'approval_rate': approval_rate
+    }
+
+
+def compare_days(today_metrics, yesterday_metrics):
+    """Сравнение метрик двух дней по филиалам"""
+    comparison = today_metrics.join(yesterday_metrics, how='outer', lsuffix='_today', rsuffix='_yesterday').fillna(0)
+    comparison['change'] = comparison['total_today'] - comparison['total_yesterday']
+    return comparison
+
+
+def compare_sources(scoring_counts, excel_counts):
+    """Количество заявок по филиалам через скоринг и через 1С"""
+    comparison = pd.concat([
+        scoring_counts.rename('scoring'),
+        excel_counts.rename('excel'),
+    ], axis=1).fillna(0).astype('int64')
+    comparison['total'] = comparison['scoring'] + comparison['excel']
+    # Категориальные колонки дают нулевые строки для отсутствующих филиалов
+    comparison = comparison[comparison['total'] > 0].copy()
+    comparison['share'] = (comparison['scoring'] / comparison['total'] * 100).where(comparison['total'] > 0, 0.0)
+    return comparison
+
+
+def branch_stats_table(metrics):
+    """Таблица детальной статистики по филиалам"""
+    return pd.DataFrame({
+        'Филиал': metrics.index,
+        'Всего заявок': metrics['total'].to_numpy(),
+        'Одобрено': metrics['approved'].to_numpy(),
+        'Отказано': metrics['rejected'].to_numpy(),
+        'Процент одобрения': [f"{rate:.1f}%" for rate in metrics['approval_rate']],
+    })
+
+
+class MetricsCube:
+    """Куб количеств заявок по дню, филиалу, менеджеру и результату.
+
+    Строится один раз при загрузке данных и дополняется только новыми строками.
+    Все панели дашборда считаются по кубу, поэтому их стоимость зависит от числа
+    различных дней и филиалов, а не от числа строк скоринга.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts = _empty_counts()
+        self.rows_seen = 0
+        # Версия данных, по которой построен куб
+        self.version = None
+
+    @staticmethod
+    def _aggregate(data):
+        """Сворачивает строки скоринга в количества по измерениям куба"""
+        if len(data) == 0:
+            return _empty_counts()
+        day = data['Дата'].dt.normalize().rename('day')
+        return (data.groupby([day, 'Филиал', 'Менеджер', 'Результат'], dropna=False, observed=True)
+                .size().rename('count').reset_index())
+
+    @staticmethod
+    def _merge(counts, new_counts):
+        """Складывает два набора количеств"""
+        if len(counts) == 0:
+            return new_counts
+        merged = pd.concat([counts, new_counts], ignore_index=True)
+        return merged.groupby(CUBE_DIMENSIONS, dropna=False, observed=True)['count'].sum().reset_index()
+
+    def refresh(self, data, appended_from=None, version=None):
+        """Обновляет куб: дописывает новые строки или перестраивает целиком.
+
+        appended_from - позиция, начиная с которой строки в data новые. Если она
+        совпадает с числом уже учтенных строк, агрегируются только новые строки.
+        """
+        with self._lock:
+            if appended_from is not None and appended_from == self.rows_seen:
+                new_rows = data.iloc[self.rows_seen:]
+                counts = self._merge(self.counts, self._aggregate(new_rows)) if len(new_rows) else self.counts
+            else:
+                counts = self._aggregate(data)
+            self.counts = counts
+            self.rows_seen = len(data)
+            self.version = version
+
+    def period(self, start, end=None):
+        """Часть куба за период [start, end] (даты включительно; end=None - без верхней границы)"""
+        counts = self.counts
+        mask = counts['day'] >= pd.Timestamp(start)
+        if end is not None:
+            mask &= counts['day'] <= pd.Timestamp(end)
+        return counts[mask]
+
+    def metrics(self, keys, start, end=None):
+        """Метрики по ключам группировки (измерениям куба) за период"""
+        if not isinstance(keys, list):
+            keys = [keys]
+        counts = self.period(start, end)
+        if len(counts) == 0:
+            return _empty_metrics()
+        pivot = counts.groupby(keys + ['Результат'], dropna=False, observed=True)['count'].sum().unstack(fill_value=0)
+        return _metrics_from_counts(pivot)
+
+    def status_counts(self, start, end=None):
+        """Количество заявок по результату за период"""
+        counts = self.period(start, end)
+        return counts.groupby('Результат', observed=True)['count'].sum()
+
+    def totals(self, start, end=None):
+        """Итоговые метрики за период в формате get_status_metrics"""
+        return _status_metrics_from_counts(self.status_counts(start, end))
+
+    def crosstab(self, column, start, end=None):
+        """Таблица количеств column x Результат за период"""
+        counts = self.period(start, end)
+        return counts.pivot_table(index=column, columns='Результат', values='count',
+                                  aggfunc='sum', fill_value=0, observed=True)
+
+    def daily(self, start, end=None):
+        """Количество заявок по дням и результатам за период"""
+        counts = self.period(start, end)
+        daily_status = counts.pivot_table(index='day', columns='Результат', values='count',
+                                          aggfunc='sum', fill_value=0, observed=True)
+        daily_status.index = daily_status.index.date
+        return daily_status
@@ -0,0 +1,205 @@
+import atexit
+import json
+import os
+import queue
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from logger_config import setup_logger, log_dir
+
+logger = setup_logger('perf')
+
+# Файл метрик в формате JSON lines (пустое значение отключает запись)
+PERF_METRICS_FILE = os.getenv('PERF_METRICS_FILE', os.path.join(log_dir, 'perf_metrics.jsonl'))
+# Размер файла, после которого он переименовывается в .1 и начинается заново
+PERF_METRICS_MAX_BYTES = int(os.getenv('PERF_METRICS_MAX_BYTES', str(10 * 1024 * 1024)))
+# Сколько последних замеров хранится в памяти процесса
+PERF_RECENT_SPANS = int(os.getenv('PERF_RECENT_SPANS', '500'))
+
+
+class Span:
+    """Замер одного этапа: длительность и атрибуты (строки, байты, попадание в кэш)"""
+
+    def __init__(self, name, parent=None, **attrs):
+        self.name = name
+        self.parent = parent
+        self.attrs = attrs
+        self.started_at = datetime.now()
+        self.seconds = None
+
+    def set(self, **attrs):
+        """Добавляет атрибуты замера, например rows=..., bytes=..., cache='hit'"""
+        self.attrs.update(attrs)
+        return self
+
+    def to_record(self):
+        record = {
+            'ts': self.started_at.isoformat(timespec='milliseconds'),
+            'name': self.name,
+            'seconds': round(self.seconds, 6) if self.seconds is not None else None,
+            'parent': self.parent,
+            'pid': os.getpid(),
+            'thread': threading.current_thread().name,
+        }
+        record.update(self.attrs)
+        return record
+
+
+class SectionTimer:
+    """Последовательные замеры участков кода без вложенных блоков with.
+
+    Каждый вызов mark(name) записывает этап prefix.name длительностью от
+    предыдущей отметки (или от создания таймера).
+    """
+
+    def __init__(self, recorder, prefix, parent=None):
+        self.recorder = recorder
+        self.prefix = prefix
+        self.parent = parent
+        self._started_at = datetime.now()
+        self._started = time.perf_counter()
+
+    def mark(self, name, **attrs):
+        now = time.perf_counter()
+        current = Span(f"{self.prefix}.{name}", self.parent, **attrs)
+        current.started_at = self._started_at
+        current.seconds = now - self._started
+        self.recorder.record(current)
+        self._started_at = datetime.now()
+        self._started = now
+        return current
+
+
+class PerfRecorder:
+    """Сборщик замеров процесса.
+
+    Замеры хранятся в памяти (для панели дашборда) и через очередь
+    передаются фоновому потоку, который дописывает их в файл JSON lines для
+    последующего анализа; поток запросов файла не касается. Поток записи
+    запускается при первом замере. Вложенность этапов отслеживается в
+    пределах потока.
+    """
+
+    def __init__(self, metrics_file=PERF_METRICS_FILE, max_bytes=PERF_METRICS_MAX_BYTES,
+                 recent=PERF_RECENT_SPANS):
+        self.metrics_file = metrics_file
+        self.max_bytes = max_bytes
+        self.recent = deque(maxlen=recent)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._write_failed = False
+        self._queue = queue.SimpleQueue()
+        self._writer = None
+
+    def _stack(self):
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    @contextmanager
+    def span(self, name, **attrs):
+        """Контекст замера этапа; ошибка внутри помечается атрибутом error"""
+        stack = self._stack()
+        current = Span(name, stack[-1].name if stack else None, **attrs)
+        stack.append(current)
+        started = time.perf_counter()
+        try:
+            yield current
+        except BaseException as e:
+            current.set(error=type(e).__name__)
+            raise
+        finally:
+            current.seconds = time.perf_counter() - started
+            stack.pop()
+            self.record(current)
+
+    def sections(self, prefix):
+        """Таймер для последовательных участков линейного кода (см. SectionTimer)"""
+        stack = self._stack()
+        return SectionTimer(self, prefix, stack[-1].name if stack else None)
+
+    def record(self, span):
+        record = span.to_record()
+        with self._lock:
+            self.recent.append(record)
+            if self.metrics_file and self._writer is None:
+                self._start_writer()
+        if self.metrics_file:
+            self._queue.put(record)
+
+    def _start_writer(self):
+        """Запускает поток записи в файл (вызывается под self._lock)"""
+        self._writer = threading.Thread(target=self._run_writer, name='perf-writer', daemon=True)
+        self._writer.start()
+        atexit.register(self.flush)
+
+    def _run_writer(self):
+        """Забирает замеры из очереди и дописывает их в файл пачками"""
+        while True:
+            items = [self._queue.get()]
+            while True:
+                try:
+                    items.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            records = [item for item in items if isinstance(item, dict)]
+            if records:
+                self._write(records)
+            # Ожидающие flush() получают сигнал после записи предшествующих замеров
+            for item in items:
+                if isinstance(item, threading.Event):
+                    item.set()
+
+    def flush(self, timeout=5.0):
+        """Ждет записи в файл всех переданных ранее замеров"""
+        if self._writer is None or not self._writer.is_alive():
+            return
+        done = threading.Event()
+        self._queue.put(done)
+        done.wait(timeout)
+
+    def _write(self, records):
+        """Дописывает замеры в файл, при превышении размера начинает новый"""
+        try:
+            directory = os.path.dirname(self.metrics_file)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            if self.max_bytes and os.path.exists(self.metrics_file) \
+                    and os.path.getsize(self.metrics_file) >= self.max_bytes:
+                os.replace(self.metrics_file, f"{self.metrics_file}.1")
+            with open(self.metrics_file, 'a', encoding='utf-8') as f:
+                f.write(''.join(json.dumps(record, ensure_ascii=False, default=str) + '\n'
+                                for record in records))
+        except Exception as e:
+            # Ошибка записи метрик не должна мешать работе; сообщаем один раз
+            if not self._write_failed:
+                logger.warning(f"Не удалось записать метрики производительности: {str(e)}")
+                self._write_failed = True
+
+    def read_recent(self, limit=200):
+        """Последние замеры всех процессов из файла (или из памяти, если файл отключен)"""
+        if not self.metrics_file or not os.path.exists(self.metrics_file):
+            with self._lock:
+                return list(self.recent)[-limit:]
+
+        with open(self.metrics_file, 'rb') as f:
+            # Читаем только конец файла
+            f.seek(0, os.SEEK_END)
+            f.seek(max(0, f.tell() - limit * 512))
+            lines = f.read().decode('utf-8', errors='replace').splitlines()[-limit:]
+
+        records = []
+        for line in lines:
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+        return records
+
+
+# Общий сборщик процесса
+perf = PerfRecorder()
+span = perf.span
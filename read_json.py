@@ -1,15 +1,46 @@
-import requests
+import threading
+import time
 import os
 from dotenv import load_dotenv
+from perf import span
 load_dotenv()
 
 LINK = os.environ.get("LINK")
 
+# Таймаут запроса ключа сервисного аккаунта и время жизни кэша в секундах
+REQUEST_TIMEOUT = float(os.environ.get("LINK_TIMEOUT", "30"))
+CREDENTIALS_TTL = float(os.environ.get("CREDENTIALS_TTL", "3600"))
 
-def response_json():
+_lock = threading.Lock()
+# Одна сессия на процесс: соединение с LINK переиспользуется (keep-alive)
+_session = None
+_cached = None
+_expires_at = 0.0
 
-    headers = {
-        'Content-Type': 'application/json'
-        }
-    response = requests.get(LINK, headers=headers)
-    return response.json()
\ No newline at end of file
+
+def _get_session():
+    """HTTP-сессия создается при первом запросе (requests не импортируется при старте)"""
+    global _session
+    if _session is None:
+        import requests
+
+        _session = requests.Session()
+        _session.headers.update({'Content-Type': 'application/json'})
+    return _session
+
+
+def response_json(force=False):
+    """Ключ сервисного аккаунта; кэшируется на CREDENTIALS_TTL секунд"""
+    global _cached, _expires_at
+
+    with _lock, span('credentials.fetch') as s:
+        if not force and _cached is not None and time.monotonic() < _expires_at:
+            s.set(cache='hit')
+            return _cached
+
+        response = _get_session().get(LINK, timeout=REQUEST_TIMEOUT)
+        response.raise_for_status()
+        s.set(cache='miss', bytes=len(response.content))
+        _cached = response.json()
+        _expires_at = time.monotonic() + CREDENTIALS_TTL
+        return _cached
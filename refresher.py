@@ -0,0 +1,132 @@
+import argparse
+import os
+import threading
+import time
+import pandas as pd
+from dotenv import load_dotenv
+from snapshot_store import SnapshotStore
+from tiering import DailyTotalsStore, hot_start, split_hot
+from logger_config import setup_logger
+
+load_dotenv()
+
+logger = setup_logger('refresher')
+
+# Интервал плановых обновлений в секундах
+REFRESH_INTERVAL = int(os.getenv("REFRESH_INTERVAL", "300"))
+
+_background_lock = threading.Lock()
+_background_thread = None
+
+
+class Refresher:
+    """Фоновое обновление: загружает данные из источников и публикует снимок"""
+
+    def __init__(self, snapshot_store=None, interval=REFRESH_INTERVAL, poll_interval=1.0, totals_store=None):
+        self.snapshot_store = snapshot_store or SnapshotStore()
+        self.totals_store = totals_store or DailyTotalsStore()
+        self.interval = interval
+        self.poll_interval = poll_interval
+
+    def run_once(self):
+        """Один цикл загрузки и публикации"""
+        logger.info("Начало фонового обновления данных")
+        try:
+            from data_loader import get_combined_data
+            from scoring_store import ScoringStore
+
+            store = ScoringStore()
+            data = get_combined_data(store)
+            scoring_df, excel_df = data.scoring_df, data.excel_df
+            appended_from = store.appended_from
+
+            if data.partial:
+                # Для недоступного источника оставляем данные предыдущего снимка
+                previous = self.snapshot_store.load()
+                if scoring_df is None:
+                    if previous is None:
+                        logger.error("Данные скоринга недоступны, снимок не опубликован")
+                        return None
+                    scoring_df = previous.scoring_df
+                    appended_from = len(scoring_df)
+                if excel_df is None:
+                    excel_df = previous.excel_df if previous is not None else \
+                        pd.DataFrame({'Дата': pd.Series(dtype='datetime64[ns]'), 'Филиал': pd.Series(dtype=object)})
+
+            # Дневные итоги считаются только по свежим данным источников. Для скоринга
+            # пересчитывается горячее окно, более ранние дни заморожены (после полной
+            # синхронизации пересчитывается вся загруженная история)
+            start = hot_start()
+            daily_totals = self.totals_store.load()
+            if data.scoring_df is not None:
+                if store.appended_from is None:
+                    daily_totals = self.totals_store.update('scoring', data.scoring_df)
+                else:
+                    daily_totals = self.totals_store.update('scoring', data.scoring_df, start,
+                                                            data.scoring_df.iloc[store.appended_from:])
+                # Итоги сохранены, строки старше окна хранения (SCORING_DATE_WINDOW_DAYS)
+                # переносятся в архив скоринга
+                store.evict()
+            if data.excel_df is not None:
+                daily_totals = self.totals_store.update('1c', data.excel_df)
+
+            # В снимок попадает только горячее окно
+            scoring_df, appended_from = split_hot(scoring_df, start, appended_from)
+            excel_df, _ = split_hot(excel_df, start)
+
+            return self.snapshot_store.publish(scoring_df, excel_df, appended_from, data.errors,
+                                               daily_totals, start)
+        except Exception as e:
+            # Предыдущий снимок остается доступным
+            logger.error(f"Ошибка фонового обновления данных: {str(e)}")
+            return None
+
+    def _wait_next_cycle(self):
+        """Ждет интервал обновления или ручной запрос"""
+        deadline = time.monotonic() + self.interval
+        while time.monotonic() < deadline:
+            if self.snapshot_store.take_refresh_request():
+                logger.info("Получен запрос на немедленное обновление")
+                return
+            time.sleep(self.poll_interval)
+
+    def run_forever(self):
+        # Запрос, оставшийся с прошлого запуска, выполняется первым циклом
+        self.snapshot_store.take_refresh_request()
+        while True:
+            self.run_once()
+            self._wait_next_cycle()
+
+
+def start_background_refresher(interval=REFRESH_INTERVAL):
+    """Запускает обновление в фоновом потоке текущего процесса (один раз на процесс)"""
+    global _background_thread
+    with _background_lock:
+        if _background_thread is None or not _background_thread.is_alive():
+            refresher = Refresher(interval=interval)
+            _background_thread = threading.Thread(
+                target=refresher.run_forever, name="data-refresher", daemon=True
+            )
+            _background_thread.start()
+            logger.info(f"Фоновое обновление запущено в потоке, интервал {interval} с")
+    return _background_thread
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Фоновое обновление данных дашборда")
+    parser.add_argument("--interval", type=int, default=REFRESH_INTERVAL,
+                        help="интервал обновления в секундах")
+    parser.add_argument("--once", action="store_true",
+                        help="выполнить одно обновление и завершиться")
+    args = parser.parse_args()
+
+    refresher = Refresher(interval=args.interval)
+    if args.once:
+        if refresher.run_once() is None:
+            raise SystemExit(1)
+    else:
+        refresher.run_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+import argparse
+import json
+import os
+from datetime import datetime, timedelta
+from html import escape
+import pandas as pd
+from metrics import MetricsCube, compare_sources
+from cards import branch_cards_html, comparison_cards_html
+from time_index import period_slice, with_date_index
+from logger_config import setup_logger
+
+logger = setup_logger('report')
+
+# Стили карточек те же, что в дашборде, чтобы отчет выглядел привычно
+REPORT_CSS = """
+body { font-family: sans-serif; margin: 20px; color: #0f1b2a; }
+h1 { text-align: center; color: white; padding: 20px; border-radius: 10px; background: linear-gradient(90deg, #ff8c00, #ff4500); }
+table { border-collapse: collapse; margin: 10px 0; }
+th, td { border: 1px solid #e0e0e0; padding: 6px 10px; text-align: center; }
+th { background-color: #f8f9fa; }
+.branch-card { background-color: white; border-radius: 10px; padding: 20px; margin: 10px 0; box-shadow: 0 4px 6px rgba(0, 0, 0, 0.1); }
+.branch-name { font-size: 20px; font-weight: bold; color: #2c3e50; margin-bottom: 15px; border-bottom: 2px solid #e0e0e0; padding-bottom: 5px; }
+.stats-container { display: flex; justify-content: space-between; margin-bottom: 10px; }
+.stat-item { text-align: center; flex: 1; padding: 0 10px; }
+.stat-value { font-size: 24px; font-weight: bold; margin-bottom: 5px; }
+.stat-label { font-size: 12px; color: #666; }
+.approved { color: #28a745; }
+.rejected { color: #dc3545; }
+.total { color: #17a2b8; }
+.approval-rate { color: #6f42c1; }
+"""
+
+FORMATS = ['csv', 'json', 'html']
+
+
+def standard_periods(today):
+    """Периоды, которые показывает дашборд"""
+    return [
+        ("Сегодня", today, today),
+        ("Вчера", today - timedelta(days=1), today - timedelta(days=1)),
+        ("За неделю", today - timedelta(days=7), today),
+        ("За месяц", today - timedelta(days=30), today),
+    ]
+
+
+def parse_range(value):
+    """Период вида ГГГГ-ММ-ДД:ГГГГ-ММ-ДД"""
+    start, _, end = value.partition(':')
+    start = datetime.strptime(start, '%Y-%m-%d').date()
+    end = datetime.strptime(end, '%Y-%m-%d').date() if end else start
+    return (f"{start:%d.%m.%Y} - {end:%d.%m.%Y}", start, end)
+
+
+def _period_first(df):
+    return df[['period'] + [column for column in df.columns if column != 'period']]
+
+
+def build_report(scoring_df, excel_df, periods):
+    """Все таблицы отчета; строки скоринга сворачиваются в куб один раз"""
+    cube = MetricsCube()
+    cube.refresh(scoring_df)
+
+    summary = []
+    branches = []
+    managers = []
+    for name, start, end in periods:
+        totals = cube.totals(start, end)
+        excel_period = period_slice(excel_df, start, end)
+        summary.append({'period': name, 'start': start, 'end': end, **totals, 'excel_total': len(excel_period)})
+
+        branch_metrics = cube.metrics('Филиал', start, end)
+        comparison = compare_sources(branch_metrics['total'], excel_period['Филиал'].value_counts())
+        branch_table = branch_metrics.join(comparison[['excel', 'share']], how='outer').fillna(0)
+        # После outer join количества стали float; в отчете они должны оставаться целыми
+        count_columns = ['total', 'approved', 'rejected', 'excel']
+        branch_table[count_columns] = branch_table[count_columns].astype('int64')
+        branches.append(branch_table.rename_axis('Филиал').reset_index().assign(period=name))
+
+        manager_metrics = cube.metrics('Менеджер', start, end)
+        managers.append(manager_metrics.rename_axis('Менеджер').reset_index().assign(period=name))
+
+    return {
+        'summary': pd.DataFrame(summary),
+        'branches': _period_first(pd.concat(branches, ignore_index=True)),
+        'managers': _period_first(pd.concat(managers, ignore_index=True)),
+    }
+
+
+def write_csv(tables, output_dir):
+    for name, table in tables.items():
+        table.to_csv(os.path.join(output_dir, f"{name}.csv"), index=False, encoding='utf-8-sig')
+
+
+def write_json(tables, output_dir, meta):
+    payload = dict(meta)
+    payload.update({name: json.loads(table.to_json(orient='records', date_format='iso', force_ascii=False))
+                    for name, table in tables.items()})
+    with open(os.path.join(output_dir, "report.json"), 'w', encoding='utf-8') as f:
+        json.dump(payload, f, ensure_ascii=False, indent=2)
+
+
+def write_html(tables, output_dir, meta):
+    """Статический HTML: итоги, карточки филиалов и таблицы по каждому периоду"""
+    parts = [
+        f"<html><head><meta charset='utf-8'><title>Отчет скоринга Kredit Market</title><style>{REPORT_CSS}</style></head><body>",
+        "<h1>Отчет скоринга Kredit Market</h1>",
+        f"<p>Сформирован: {escape(meta['generated_at'])}. Данные обновлены: {escape(str(meta['refreshed_at']))}</p>",
+        tables['summary'].to_html(index=False, float_format=lambda value: f"{value:.1f}"),
+    ]
+    for period, branch_table in tables['branches'].groupby('period', sort=False):
+        branch_table = branch_table.set_index('Филиал')
+        parts.append(f"<h2>{escape(period)}</h2>")
+        parts.append("<h3>Скоринг по филиалам</h3>")
+        parts.append(branch_cards_html(branch_table[branch_table['total'] > 0]))
+        parts.append("<h3>Заявки через скоринг и 1С</h3>")
+        comparison = branch_table.assign(scoring=branch_table['total'], total=branch_table['total'] + branch_table['excel'])
+        parts.append(comparison_cards_html(comparison[comparison['total'] > 0]))
+        managers = tables['managers'][tables['managers']['period'] == period].drop(columns='period')
+        parts.append("<h3>Менеджеры</h3>")
+        parts.append(managers.to_html(index=False, float_format=lambda value: f"{value:.1f}"))
+    parts.append("</body></html>")
+
+    with open(os.path.join(output_dir, "report.html"), 'w', encoding='utf-8') as f:
+        f.write("\n".join(parts))
+
+
+def _check_1c_retention(history, earliest):
+    """Строки 1С старше срока хранения истории удалены: отчет за эти дни был бы занижен"""
+    retention_start = history.retention_start()
+    if earliest < retention_start:
+        raise SystemExit(f"Строки 1С хранятся с {retention_start:%d.%m.%Y} (HISTORY_RETENTION_DAYS), "
+                         f"а период отчета начинается {earliest:%d.%m.%Y}; "
+                         f"за более ранние дни есть только дневные итоги (cache/daily_totals.feather)")
+
+
+def load_data(source, earliest):
+    """Данные для отчета с дня earliest: опубликованный снимок или загрузка из источников.
+
+    Снимок содержит только горячее окно; строки более ранних дней берутся из
+    архива скоринга и истории 1С.
+    """
+    from scoring_store import ScoringStore
+    from history_store import DailyPartitionStore
+
+    store = ScoringStore()
+    history = DailyPartitionStore()
+    _check_1c_retention(history, earliest)
+
+    if source == "snapshot":
+        from snapshot_store import SnapshotStore
+
+        snapshot = SnapshotStore().load()
+        if snapshot is None:
+            raise SystemExit("Снимок данных еще не опубликован, запустите refresher.py или используйте --source live")
+        scoring_df, excel_df = snapshot.scoring_df, snapshot.excel_df
+        if snapshot.hot_start is not None and earliest < snapshot.hot_start:
+            logger.info(f"Строки до {snapshot.hot_start:%d.%m.%Y} берутся из архива скоринга и истории 1С")
+            scoring_df = pd.concat([store.read_history(earliest, snapshot.hot_start), scoring_df], ignore_index=True)
+            excel_df = pd.concat([history.read(earliest, snapshot.hot_start - timedelta(days=1)), excel_df],
+                                 ignore_index=True)
+        return scoring_df, with_date_index(excel_df)[0], snapshot.refreshed_at
+
+    from data_loader import get_combined_data
+
+    data = get_combined_data(store)
+    if data.scoring_df is None:
+        raise SystemExit(f"Данные скоринга недоступны: {data.errors}")
+    if data.excel_df is None:
+        raise SystemExit(f"Данные 1С недоступны: {data.errors}")
+    # Хранилище скоринга содержит только окно дат, более ранние дни - в архиве
+    return store.read_history(earliest), with_date_index(data.excel_df)[0], datetime.now()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Отчет дашборда скоринга без запуска Streamlit")
+    parser.add_argument("--source", choices=["snapshot", "live"], default="snapshot",
+                        help="snapshot - последний опубликованный снимок, live - загрузка из источников")
+    parser.add_argument("--output-dir", default="reports", help="каталог для файлов отчета")
+    parser.add_argument("--format", nargs='+', choices=FORMATS, default=FORMATS, help="форматы отчета")
+    parser.add_argument("--range", action="append", default=[], type=parse_range, dest="ranges",
+                        help="дополнительный период ГГГГ-ММ-ДД:ГГГГ-ММ-ДД (можно указать несколько раз)")
+    parser.add_argument("--no-standard", action="store_true", help="не включать стандартные периоды дашборда")
+    args = parser.parse_args(argv)
+
+    periods = ([] if args.no_standard else standard_periods(datetime.now().date())) + args.ranges
+    if not periods:
+        parser.error("не задано ни одного периода")
+    scoring_df, excel_df, refreshed_at = load_data(args.source, min(start for _, start, _ in periods))
+
+    tables = build_report(scoring_df, excel_df, periods)
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    meta = {
+        'generated_at': datetime.now().isoformat(timespec='seconds'),
+        'refreshed_at': refreshed_at.isoformat(timespec='seconds'),
+    }
+    if 'csv' in args.format:
+        write_csv(tables, args.output_dir)
+    if 'json' in args.format:
+        write_json(tables, args.output_dir, meta)
+    if 'html' in args.format:
+        write_html(tables, args.output_dir, meta)
+    logger.info(f"Отчет сформирован в {args.output_dir}: периодов {len(periods)}, форматы {', '.join(args.format)}")
+
+
+if __name__ == "__main__":
+    main()
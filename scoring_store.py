@@ -0,0 +1,264 @@
+import hashlib
+import json
+import os
+from datetime import date, datetime, timedelta
+import pandas as pd
+from pandas.api.types import union_categoricals
+import pyarrow as pa
+import pyarrow.feather as feather
+from gspread.utils import rowcol_to_a1
+from logger_config import setup_logger
+from perf import span
+from file_lock import FileLock, atomic_path
+from date_parser import parse_dates
+from branch_normalizer import branch_normalizer
+from dtype_schema import apply_schema
+from tiering import HOT_WINDOW_DAYS
+from history_store import DailyPartitionStore
+
+logger = setup_logger('scoring_store')
+
+# Колонки листа, которые использует дашборд
+SCORING_COLUMNS = ['Дата', 'Результат', 'Филиал', 'Менеджер']
+# Сколько последних дней скоринга хранить локально; более старые строки переносятся
+# в архив скоринга. Окно не короче горячего окна дашборда: его строки нужны снимку
+SCORING_DATE_WINDOW_DAYS = int(os.getenv("SCORING_DATE_WINDOW_DAYS", str(HOT_WINDOW_DAYS)))
+
+# Ключи метаданных Arrow для водяного знака синхронизации
+SYNCED_ROWS_KEY = b'synced_rows'
+TAIL_CHECKSUM_KEY = b'tail_checksum'
+COLUMN_POSITIONS_KEY = b'column_positions'
+# Начало дней, строки которых хранятся в хранилище; более ранние дни - в архиве
+ARCHIVED_BEFORE_KEY = b'archived_before'
+
+
+class ScoringStore:
+    """Локальное хранилище строк листа Scoring с инкрементальной синхронизацией.
+
+    Лист только дописывается снизу, поэтому храним число уже загруженных строк
+    и контрольную сумму последних из них. При обновлении запрашиваются только
+    новые строки и только нужные колонки (одним batch_get по колонкам);
+    полная перезагрузка выполняется, если позиции колонок в заголовке или уже
+    загруженный хвост листа изменились. Строки старше окна дат переносятся
+    методом evict в архив по дням (после того, как по ним сохранены дневные итоги).
+    """
+
+    def __init__(self, store_file="cache/scoring_rows.feather", checksum_rows=20,
+                 columns=SCORING_COLUMNS, date_window_days=None, archive=None):
+        self.store_file = store_file
+        self.checksum_rows = checksum_rows
+        # Загружаемые колонки (None - все колонки заголовка)
+        self.columns = columns
+        self.date_window_days = SCORING_DATE_WINDOW_DAYS if date_window_days is None else date_window_days
+        # Позиция первой новой строки после последней синхронизации (None - полная загрузка)
+        self.appended_from = None
+        os.makedirs(os.path.dirname(store_file), exist_ok=True)
+        # Архив строк старше окна дат: один файл на день, хранится без ограничения срока
+        self.archive = archive or DailyPartitionStore(
+            os.path.join(os.path.dirname(store_file), "scoring_archive"), retention_days=None, name="архива скоринга"
+        )
+
+    @staticmethod
+    def _checksum(values):
+        """Контрольная сумма сырых значений"""
+        payload = json.dumps(values, ensure_ascii=False).encode('utf-8')
+        return hashlib.sha1(payload).hexdigest()
+
+    def _tail_checksum(self, columns):
+        """Контрольная сумма последних checksum_rows строк (колонки одной длины)"""
+        return self._checksum([list(column[-self.checksum_rows:]) for column in columns])
+
+    @staticmethod
+    def _column_letter(position):
+        return rowcol_to_a1(1, position).rstrip('0123456789')
+
+    @staticmethod
+    def _pad_columns(columns, length=None):
+        """Выравнивает колонки по длине (Sheets обрезает пустые ячейки в конце колонки)"""
+        if length is None:
+            length = max((len(column) for column in columns), default=0)
+        return [list(column[:length]) + [''] * (length - len(column)) for column in columns]
+
+    def _resolve_positions(self, header):
+        """Позиции нужных колонок в заголовке листа (нумерация с 1)"""
+        header = [str(name).strip() for name in header]
+        if self.columns is None:
+            return {name: position for position, name in enumerate(header, start=1) if name}
+
+        positions = {name: position for position, name in enumerate(header, start=1) if name}
+        missing = [name for name in self.columns if name not in positions]
+        if missing:
+            raise ValueError(f"В листе скоринга нет колонок {missing}. Колонки: {header}")
+        return {name: positions[name] for name in self.columns}
+
+    def window_start(self):
+        """Первый день, строки которого хранятся локально"""
+        return datetime.now().date() - timedelta(days=max(self.date_window_days, HOT_WINDOW_DAYS))
+
+    def _load(self):
+        """Загружает сохраненные строки и водяной знак"""
+        if not os.path.exists(self.store_file):
+            return None, 0, None, None, None
+        try:
+            table = feather.read_table(self.store_file, memory_map=True)
+            metadata = table.schema.metadata or {}
+            synced_rows = int(metadata.get(SYNCED_ROWS_KEY, b'0'))
+            checksum = metadata.get(TAIL_CHECKSUM_KEY, b'').decode('utf-8') or None
+            positions = json.loads(metadata[COLUMN_POSITIONS_KEY]) if COLUMN_POSITIONS_KEY in metadata else None
+            archived_before = metadata.get(ARCHIVED_BEFORE_KEY, b'').decode('utf-8') or None
+            archived_before = date.fromisoformat(archived_before) if archived_before else None
+            return table.to_pandas(), synced_rows, checksum, positions, archived_before
+        except Exception as e:
+            logger.error(f"Ошибка чтения хранилища скоринга: {str(e)}")
+            return None, 0, None, None, None
+
+    def _save(self, df, synced_rows, checksum, positions, archived_before=None):
+        """Сохраняет строки вместе с водяным знаком"""
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        metadata = dict(table.schema.metadata or {})
+        metadata[SYNCED_ROWS_KEY] = str(synced_rows).encode('utf-8')
+        metadata[TAIL_CHECKSUM_KEY] = checksum.encode('utf-8')
+        metadata[COLUMN_POSITIONS_KEY] = json.dumps(positions, ensure_ascii=False).encode('utf-8')
+        if archived_before is not None:
+            metadata[ARCHIVED_BEFORE_KEY] = archived_before.isoformat().encode('utf-8')
+        with atomic_path(self.store_file) as temp_path:
+            feather.write_feather(table.replace_schema_metadata(metadata), temp_path)
+
+    def _fetch(self, worksheet, positions, first_row):
+        """Одним запросом: заголовок и колонки positions начиная со строки first_row"""
+        letters = [self._column_letter(position) for position in positions.values()]
+        ranges = worksheet.batch_get(
+            ["1:1"] + [f"{letter}{first_row}:{letter}" for letter in letters],
+            major_dimension='COLUMNS',
+        )
+        header = [column[0] if column else '' for column in ranges[0]]
+        columns = [list(value_range[0]) if value_range else [] for value_range in ranges[1:]]
+        return header, columns
+
+    def _build_frame(self, names, columns):
+        """Строит DataFrame из колонок значений и разбирает даты только для них"""
+        df = pd.DataFrame(dict(zip(names, columns)), columns=names)
+        if 'Дата' in df.columns:
+            df['Дата'] = parse_dates(df['Дата'], source="скоринга")
+        if 'Филиал' in df.columns:
+            df['Филиал'] = branch_normalizer.normalize(df['Филиал'], source="скоринга")
+        return apply_schema(df, source="скоринга")
+
+    @staticmethod
+    def _append(stored_df, new_df):
+        """Дописывает новые строки, сохраняя категориальные колонки"""
+        df = pd.concat([stored_df, new_df], ignore_index=True)
+        for column in new_df.columns:
+            if isinstance(new_df[column].dtype, pd.CategoricalDtype) and \
+                    isinstance(stored_df[column].dtype, pd.CategoricalDtype):
+                df[column] = union_categoricals([stored_df[column], new_df[column]], ignore_order=True)
+        # Хранилище, записанное до введения схемы, приводится к ней при первом дописывании
+        return apply_schema(df, source="скоринга")
+
+    def _full_resync(self, worksheet):
+        """Полная загрузка нужных колонок листа"""
+        logger.info("Полная синхронизация листа скоринга")
+        self.appended_from = None
+
+        header = worksheet.row_values(1)
+        if not header:
+            return pd.DataFrame()
+        positions = self._resolve_positions(header)
+        _, columns = self._fetch(worksheet, positions, 2)
+        columns = self._pad_columns(columns)
+        synced_rows = len(columns[0]) if columns else 0
+
+        df = self._build_frame(list(positions), columns)
+        self._save(df, synced_rows, self._tail_checksum(columns), positions)
+        logger.info(f"Загружено строк скоринга: {synced_rows}, колонок: {len(positions)} из {len(header)}")
+        return df
+
+    def sync(self, worksheet):
+        """Синхронизирует локальное хранилище с листом и возвращает все строки"""
+        # Параллельные синхронизации (несколько процессов обновления) выполняются по очереди
+        with span('scoring.sync') as s, FileLock(f"{self.store_file}.lock"):
+            df = self._sync(worksheet)
+            s.set(mode='full' if self.appended_from is None else 'append', rows=len(df),
+                  new_rows=len(df) - (self.appended_from or 0))
+        return df
+
+    def _sync(self, worksheet):
+        stored_df, synced_rows, checksum, positions, archived_before = self._load()
+        if stored_df is None or synced_rows == 0 or checksum is None or positions is None \
+                or (self.columns is not None and list(positions) != self.columns):
+            return self._full_resync(worksheet)
+
+        # Последние загруженные строки листа и все новые строки (первая строка листа - заголовок)
+        tail_start = max(2, synced_rows + 2 - self.checksum_rows)
+        tail_length = synced_rows + 2 - tail_start
+        header, columns = self._fetch(worksheet, positions, tail_start)
+        columns = self._pad_columns(columns, max(tail_length, max((len(c) for c in columns), default=0)))
+        tail = [column[:tail_length] for column in columns]
+        new_columns = [column[tail_length:] for column in columns]
+
+        try:
+            sheet_positions = self._resolve_positions(header)
+        except ValueError:
+            sheet_positions = None
+        if sheet_positions != positions or self._tail_checksum(tail) != checksum:
+            logger.warning("Обнаружено изменение выше водяного знака, выполняем полную синхронизацию")
+            return self._full_resync(worksheet)
+
+        self.appended_from = len(stored_df)
+        new_count = len(new_columns[0]) if new_columns else 0
+        if not new_count:
+            logger.info("Новых строк скоринга нет")
+            return stored_df
+
+        new_df = self._build_frame(list(positions), new_columns)
+        df = self._append(stored_df, new_df)
+
+        combined = [old + new for old, new in zip(tail, new_columns)]
+        self._save(df, synced_rows + new_count, self._tail_checksum(combined), positions, archived_before)
+        logger.info(f"Добавлено новых строк скоринга: {new_count}")
+        return df
+
+    def evict(self, before=None):
+        """Переносит строки с датой раньше before (по умолчанию - начало окна дат) в архив.
+
+        Вызывается после сохранения дневных итогов по этим строкам. Дни, уже
+        перенесенные прошлым вызовом, дополняются строками, дописанными в лист
+        задним числом; остальные дни записываются в архив целиком (после полной
+        синхронизации в хранилище снова весь лист). Водяной знак не меняется:
+        перенесенные строки листа повторно не загружаются.
+        """
+        cutoff = before if before is not None else self.window_start()
+        with FileLock(f"{self.store_file}.lock"):
+            stored_df, synced_rows, checksum, positions, archived_before = self._load()
+            if stored_df is None or positions is None or 'Дата' not in stored_df.columns:
+                return 0
+            if archived_before is not None and archived_before >= cutoff:
+                cutoff = archived_before
+            outdated = (stored_df['Дата'] < pd.Timestamp(cutoff)).to_numpy()
+            evicted = int(outdated.sum())
+            if evicted:
+                # Сначала архив: при сбое между записями строки не теряются
+                self.archive.write(stored_df[outdated], append_before=archived_before)
+                stored_df = stored_df[~outdated].reset_index(drop=True)
+                logger.info(f"В архив скоринга перенесено строк старше {cutoff:%d.%m.%Y}: {evicted}")
+            if evicted or archived_before != cutoff:
+                self._save(stored_df, synced_rows, checksum, positions, cutoff)
+        return evicted
+
+    def read_history(self, start, before=None):
+        """Строки с датой в [start, before): дни до переноса - из архива, остальные - из хранилища"""
+        stored_df, _, _, _, archived_before = self._load()
+        frames = []
+        if archived_before is not None and start < archived_before:
+            last_day = (min(archived_before, before) if before is not None else archived_before) - timedelta(days=1)
+            frames.append(self.archive.read(start, last_day))
+        if stored_df is not None:
+            first = pd.Timestamp(max(start, archived_before) if archived_before is not None else start)
+            mask = stored_df['Дата'] >= first
+            if before is not None:
+                mask &= stored_df['Дата'] < pd.Timestamp(before)
+            frames.append(stored_df[mask.to_numpy()])
+        if not frames:
+            return pd.DataFrame({name: pd.Series(dtype='datetime64[ns]' if name == 'Дата' else object)
+                                 for name in (self.columns or ['Дата'])})
+        return apply_schema(pd.concat(frames, ignore_index=True), source="архива скоринга")
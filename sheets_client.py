@@ -0,0 +1,67 @@
+import os
+import threading
+from dotenv import load_dotenv
+from read_json import response_json
+from logger_config import setup_logger
+
+load_dotenv()
+
+logger = setup_logger('sheets_client')
+
+# Таймаут HTTP-запросов к Google Sheets в секундах: зависший запрос завершается ошибкой
+SHEETS_REQUEST_TIMEOUT = float(os.getenv("SHEETS_REQUEST_TIMEOUT", "60"))
+
+
+class SheetsClient:
+    """Долгоживущий клиент Google Sheets.
+
+    Авторизованный клиент gspread (и его HTTP-сессия с keep-alive), ключ таблицы
+    и объект листа создаются один раз на процесс. Клиент пересоздается, только
+    если изменился ключ сервисного аккаунта, поэтому при обновлении данных
+    выполняются лишь запросы за самими данными.
+    """
+
+    def __init__(self, spreadsheet_name="KreditMarket", worksheet_name="Scoring", spreadsheet_key=None):
+        self.spreadsheet_name = spreadsheet_name
+        self.worksheet_name = worksheet_name
+        self._spreadsheet_key = spreadsheet_key
+        self._lock = threading.Lock()
+        self._credentials = None
+        self._client = None
+        self._worksheet = None
+
+    def _get_client(self):
+        credentials = response_json()
+        if self._client is None or credentials != self._credentials:
+            import gspread
+
+            logger.info("Авторизация клиента Google Sheets")
+            self._client = gspread.service_account_from_dict(credentials)
+            self._client.set_timeout(SHEETS_REQUEST_TIMEOUT)
+            self._credentials = credentials
+            self._worksheet = None
+        return self._client
+
+    def worksheet(self):
+        """Лист Scoring; таблица ищется по имени только при первом обращении"""
+        with self._lock:
+            client = self._get_client()
+            if self._worksheet is None:
+                if self._spreadsheet_key:
+                    spreadsheet = client.open_by_key(self._spreadsheet_key)
+                else:
+                    spreadsheet = client.open(self.spreadsheet_name)
+                    self._spreadsheet_key = spreadsheet.id
+                    logger.info(f"Ключ таблицы {self.spreadsheet_name}: {self._spreadsheet_key}")
+                self._worksheet = spreadsheet.worksheet(self.worksheet_name)
+            return self._worksheet
+
+    def reset(self):
+        """Сбрасывает клиент и лист, например после ошибки API"""
+        with self._lock:
+            self._client = None
+            self._credentials = None
+            self._worksheet = None
+
+
+sheets_client = SheetsClient(spreadsheet_key=os.getenv("SCORING_SPREADSHEET_KEY"))
@@ -0,0 +1,205 @@
+import json
+import os
+import shutil
+import threading
+import time
+from datetime import date, datetime
+import pyarrow.feather as feather
+from cache_manager import to_arrow_table
+from time_index import with_date_index
+from logger_config import setup_logger
+
+logger = setup_logger('snapshot_store')
+
+
+class Snapshot:
+    """Опубликованная версия данных дашборда"""
+
+    def __init__(self, version, refreshed_at, scoring_df, excel_df, scoring_appended_from=None, errors=None,
+                 daily_totals=None, hot_start=None, base_version=None):
+        self.version = version
+        self.refreshed_at = refreshed_at
+        self.scoring_df = scoring_df
+        self.excel_df = excel_df
+        # Позиция первой новой строки скоринга и версия, строки которой дописаны новыми.
+        # Дописывать в куб можно только если он построен именно по base_version
+        self.scoring_appended_from = scoring_appended_from
+        self.base_version = base_version
+        # Источники, которые не удалось обновить (их данные взяты из прошлого снимка)
+        self.errors = errors or {}
+        # Дневные итоги за всю историю (строки старше hot_start в снимок не входят)
+        self.daily_totals = daily_totals
+        self.hot_start = hot_start
+
+    @property
+    def partial(self):
+        return bool(self.errors)
+
+
+class SnapshotStore:
+    """Версионированные снимки данных, публикуемые фоновым обновлением.
+
+    Каждая версия пишется в отдельный каталог, после чего манифест current.json
+    атомарно заменяется через os.replace. Читатели видят либо старую, либо новую
+    версию целиком и никогда не обращаются к источникам данных.
+    """
+
+    MANIFEST = "current.json"
+    REFRESH_REQUEST = "refresh.request"
+
+    def __init__(self, root="cache/snapshots", keep_versions=3):
+        self.root = root
+        self.keep_versions = keep_versions
+        os.makedirs(root, exist_ok=True)
+
+    @property
+    def manifest_path(self):
+        return os.path.join(self.root, self.MANIFEST)
+
+    @property
+    def refresh_request_path(self):
+        return os.path.join(self.root, self.REFRESH_REQUEST)
+
+    def publish(self, scoring_df, excel_df, scoring_appended_from=None, errors=None,
+                daily_totals=None, hot_start=None):
+        """Записывает новую версию и атомарно делает её текущей"""
+        refreshed_at = datetime.now()
+        version = refreshed_at.strftime('%Y%m%d%H%M%S%f')
+        version_dir = os.path.join(self.root, version)
+        os.makedirs(version_dir, exist_ok=True)
+
+        feather.write_feather(to_arrow_table(scoring_df), os.path.join(version_dir, "scoring.feather"))
+        feather.write_feather(to_arrow_table(excel_df), os.path.join(version_dir, "1c.feather"))
+        if daily_totals is not None:
+            feather.write_feather(to_arrow_table(daily_totals), os.path.join(version_dir, "daily.feather"))
+
+        # Новые строки продолжают текущую версию, только если её строки совпадают с прежними
+        previous = self.read_manifest()
+        base_version = None
+        if scoring_appended_from is not None and previous is not None \
+                and previous.get('scoring_rows') == scoring_appended_from:
+            base_version = previous['version']
+        else:
+            scoring_appended_from = None
+
+        manifest = {
+            'version': version,
+            'refreshed_at': refreshed_at.isoformat(),
+            'scoring_appended_from': scoring_appended_from,
+            'base_version': base_version,
+            'scoring_rows': len(scoring_df),
+            'errors': errors or {},
+            'hot_start': hot_start.isoformat() if hot_start is not None else None,
+        }
+        temp_path = f"{self.manifest_path}.{os.getpid()}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f)
+        os.replace(temp_path, self.manifest_path)
+
+        logger.info(f"Опубликован снимок данных: {version}")
+        self._remove_old_versions()
+        return version
+
+    def _remove_old_versions(self):
+        """Удаляет старые версии, оставляя несколько последних"""
+        versions = sorted(
+            name for name in os.listdir(self.root)
+            if os.path.isdir(os.path.join(self.root, name))
+        )
+        for name in versions[:-self.keep_versions]:
+            shutil.rmtree(os.path.join(self.root, name), ignore_errors=True)
+
+    def read_manifest(self):
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def load(self, previous=None):
+        """Загружает текущую версию; если она не изменилась, возвращает previous"""
+        manifest = self.read_manifest()
+        if manifest is None:
+            logger.warning("Снимок данных еще не опубликован")
+            return None
+
+        if previous is not None and previous.version == manifest['version']:
+            return previous
+
+        version_dir = os.path.join(self.root, manifest['version'])
+        scoring_df = feather.read_table(os.path.join(version_dir, "scoring.feather"), memory_map=True).to_pandas()
+        excel_df = feather.read_table(os.path.join(version_dir, "1c.feather"), memory_map=True).to_pandas()
+        # Снимки, опубликованные до разделения на слои, дневных итогов не содержат
+        daily_path = os.path.join(version_dir, "daily.feather")
+        daily_totals = feather.read_table(daily_path).to_pandas() if os.path.exists(daily_path) else None
+        hot_start = manifest.get('hot_start')
+
+        # Строки упорядочены по дате, периоды выбираются бинарным поиском (time_index.period_slice)
+        appended_from = manifest.get('scoring_appended_from')
+        base_version = manifest.get('base_version')
+        if base_version is None:
+            # Манифест без базовой версии (в том числе прежнего формата): только полная перестройка
+            appended_from = None
+        scoring_df, reordered = with_date_index(scoring_df)
+        if reordered:
+            # Позиции строк изменились, куб агрегатов перестраивается целиком
+            appended_from = None
+        excel_df, _ = with_date_index(excel_df)
+        logger.info(f"Загружен снимок данных: {manifest['version']}")
+
+        return Snapshot(
+            manifest['version'],
+            datetime.fromisoformat(manifest['refreshed_at']),
+            scoring_df,
+            excel_df,
+            appended_from,
+            manifest.get('errors'),
+            daily_totals,
+            date.fromisoformat(hot_start) if hot_start else None,
+            base_version,
+        )
+
+    def request_refresh(self):
+        """Просит фоновое обновление выполнить загрузку немедленно"""
+        with open(self.refresh_request_path, 'w', encoding='utf-8') as f:
+            f.write(datetime.now().isoformat())
+
+    def take_refresh_request(self):
+        """Проверяет и снимает запрос на немедленное обновление"""
+        try:
+            os.unlink(self.refresh_request_path)
+            return True
+        except FileNotFoundError:
+            return False
+
+
+class SnapshotReader:
+    """Общий для процесса читатель снимков.
+
+    Манифест проверяется не чаще одного раза в poll_seconds; данные перечитываются
+    с диска только при смене версии.
+    """
+
+    def __init__(self, store=None, poll_seconds=30):
+        self.store = store or SnapshotStore()
+        self.poll_seconds = poll_seconds
+        self._lock = threading.Lock()
+        self._current = None
+        self._checked_at = None
+
+    def get(self):
+        """Возвращает текущий снимок или None, если он еще не опубликован"""
+        with self._lock:
+            now = time.monotonic()
+            if self._current is None or self._checked_at is None or now - self._checked_at >= self.poll_seconds:
+                try:
+                    self._current = self.store.load(self._current) or self._current
+                except Exception as e:
+                    logger.error(f"Ошибка чтения снимка данных: {str(e)}")
+                self._checked_at = now
+            return self._current
+
+    def invalidate(self):
+        """Проверить манифест при следующем обращении"""
+        with self._lock:
+            self._checked_at = None
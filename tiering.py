@@ -0,0 +1,146 @@
+import os
+from datetime import datetime, timedelta
+import pandas as pd
+import pyarrow.feather as feather
+from dotenv import load_dotenv
+from cache_manager import to_arrow_table
+from file_lock import atomic_path
+from metrics import compute_metrics
+from logger_config import setup_logger
+from perf import span
+
+load_dotenv()
+
+logger = setup_logger('tiering')
+
+# Сколько последних дней публикуется в снимке для интерактивных панелей
+# (самый длинный период дашборда - "За месяц", 30 дней назад)
+HOT_WINDOW_DAYS = int(os.getenv("HOT_WINDOW_DAYS", "31"))
+
+DAILY_TOTALS_COLUMNS = ['day', 'Филиал', 'source', 'total', 'approved', 'rejected']
+
+
+def _empty_totals():
+    return pd.DataFrame({
+        'day': pd.Series(dtype='datetime64[ns]'),
+        'Филиал': pd.Series(dtype=object),
+        'source': pd.Series(dtype=object),
+        **{column: pd.Series(dtype='int64') for column in ('total', 'approved', 'rejected')},
+    })
+
+
+def hot_start(today=None, days=HOT_WINDOW_DAYS):
+    """Первый день горячего окна"""
+    return (today or datetime.now().date()) - timedelta(days=days)
+
+
+def hot_mask(df, start, column='Дата'):
+    """Строки горячего окна (строки без даты в окно не входят)"""
+    return (df[column] >= pd.Timestamp(start)).to_numpy()
+
+
+def split_hot(df, start, appended_from=None, column='Дата'):
+    """Строки горячего окна и позиция первой новой строки среди них.
+
+    Новые строки дописываются в конец, поэтому их позиция в окне равна числу
+    прежних строк, попавших в окно. Если окно сдвинулось и прежние строки из
+    него выпали, это число не совпадет с числом строк в кубе дашборда, и куб
+    перестроится целиком.
+    """
+    mask = hot_mask(df, start, column)
+    hot = df[mask].reset_index(drop=True) if not mask.all() else df
+    if appended_from is not None:
+        appended_from = int(mask[:appended_from].sum())
+    return hot, appended_from
+
+
+def daily_totals(df, source):
+    """Количество заявок по дням и филиалам одного источника"""
+    dated = df[df['Дата'].notna()] if len(df) else df
+    if len(dated) == 0:
+        return _empty_totals()
+
+    day = dated['Дата'].dt.normalize().rename('day')
+    if 'Результат' in dated.columns:
+        totals = compute_metrics(dated, [day, 'Филиал']).drop(columns='approval_rate')
+    else:
+        totals = dated.groupby([day, 'Филиал'], dropna=False, observed=True).size().rename('total').to_frame()
+        totals['approved'] = 0
+        totals['rejected'] = 0
+    totals = totals.reset_index()
+    totals['Филиал'] = totals['Филиал'].astype(object)
+    totals['source'] = source
+    return totals[DAILY_TOTALS_COLUMNS]
+
+
+class DailyTotalsStore:
+    """Дневные итоги по филиалам за всю историю (холодный слой).
+
+    Строки старше горячего окна в снимок не попадают, а после сохранения их
+    итогов переносятся из хранилища скоринга в архив по дням; долгосрочная
+    динамика строится только по дневным итогам. При обновлении пересчитываются
+    дни начиная с since; более ранние дни заморожены, к ним только добавляются
+    строки, дописанные в лист задним числом.
+    """
+
+    def __init__(self, path="cache/daily_totals.feather"):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return _empty_totals()
+        try:
+            return feather.read_table(self.path).to_pandas()
+        except Exception as e:
+            logger.error(f"Ошибка чтения дневных итогов: {str(e)}")
+            return _empty_totals()
+
+    def update(self, source, df, since=None, appended=None):
+        """Обновляет итоги источника и возвращает все итоги.
+
+        since - первый пересчитываемый день; None или отсутствие итогов источника -
+        пересчет с первого дня df. appended - новые строки df: те из них, что
+        датированы раньше since, добавляются к замороженным итогам.
+        """
+        with span('tiering.daily_totals', source=source) as s:
+            totals = self.load()
+            stored = totals['source'] == source
+            if since is None or not stored.any():
+                first = df['Дата'].min() if len(df) else pd.NaT
+                since = first.normalize() if pd.notna(first) else None
+                appended = None
+            else:
+                since = pd.Timestamp(since)
+
+            if since is not None:
+                fresh = daily_totals(df[(df['Дата'] >= since).to_numpy()], source)
+                parts = [totals[~stored | (totals['day'] < since).to_numpy()], fresh]
+                late = appended[(appended['Дата'] < since).to_numpy()] if appended is not None else None
+                if late is not None and len(late):
+                    parts.append(daily_totals(late, source))
+                    logger.info(f"Строк скоринга, дописанных задним числом: {len(late)}")
+                totals = pd.concat(parts, ignore_index=True)
+                if late is not None and len(late):
+                    totals = (totals.groupby(['day', 'Филиал', 'source'], dropna=False, sort=False)
+                              [['total', 'approved', 'rejected']].sum().reset_index())
+
+            totals = totals.sort_values(['day', 'source', 'Филиал'], kind='stable').reset_index(drop=True)
+            for column in ('total', 'approved', 'rejected'):
+                totals[column] = totals[column].astype('int64')
+            with atomic_path(self.path) as temp_path:
+                feather.write_feather(to_arrow_table(totals), temp_path)
+            s.set(rows=len(totals), since=None if since is None else since.date().isoformat())
+        return totals
+
+
+def weekly_trend(totals):
+    """Заявки по неделям и источникам для графика долгосрочной динамики"""
+    if totals is None or len(totals) == 0:
+        return pd.DataFrame()
+    trend = totals.pivot_table(index='day', columns='source', values='total', aggfunc='sum', fill_value=0)
+    trend = trend.resample('W').sum().rename(columns={'scoring': 'Скоринг', '1c': '1С'})
+    trend.index = trend.index.date
+    return trend
@@ -0,0 +1,32 @@
+import numpy as np
+import pandas as pd
+
+DAY_NS = pd.Timedelta(days=1).value
+
+
+def with_date_index(df, column='Дата'):
+    """Сортирует строки по дате и делает дату индексом (колонка сохраняется).
+
+    Возвращает DataFrame и признак того, что порядок строк изменился. Строки
+    без даты (NaT) оказываются в начале и не попадают ни в один период.
+    """
+    keys = df[column].to_numpy(dtype='datetime64[ns]').view('i8')
+    reordered = bool(len(keys) > 1 and (keys[1:] < keys[:-1]).any())
+    if reordered:
+        df = df.iloc[np.argsort(keys, kind='stable')]
+    return df.set_index(pd.DatetimeIndex(df[column], name=None)), reordered
+
+
+def period_slice(df, start, end=None, column='Дата'):
+    """Строки за период [start, end] (даты включительно; end=None - без верхней границы).
+
+    Границы ищутся бинарным поиском по отсортированному индексу, результат -
+    срез без копирования данных. Кадр без индекса дат сначала индексируется.
+    """
+    if not isinstance(df.index, pd.DatetimeIndex):
+        df, _ = with_date_index(df, column)
+    keys = df.index.asi8
+    lo = np.searchsorted(keys, pd.Timestamp(start).normalize().value, side='left')
+    hi = len(keys) if end is None else \
+        np.searchsorted(keys, pd.Timestamp(end).normalize().value + DAY_NS, side='left')
+    return df.iloc[lo:hi]